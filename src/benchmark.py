@@ -0,0 +1,257 @@
+"""
+Benchmarks of the simulation, run from src:
+
+    python benchmark.py kernels [side of the slick in cells]
+        compares the per-cell stages of a step (weathering and advection) of the reference Point implementation with
+        the NumPy and Numba kernel backends, on a synthetic square slick with a strip of land
+    python benchmark.py topography
+        times the extraction of land pixels from the world map for the default Gulf area and a 10x10 degrees area,
+        against a per-pixel loop
+    python benchmark.py step [side of the slick in cells] [workers]
+        times whole steps of the engine with the serial, thread and process executors, and the share of a step spent
+        in executor tasks. Only that share scales with workers, the rest of a step runs in the main process, which
+        bounds the speedup (Amdahl's law)
+"""
+import sys
+from itertools import product
+from time import perf_counter
+
+import numpy as np
+
+from data.data_processor import DataStationInfo, StationMeasurements
+from data.measurement_data import Coordinates
+from initial_values import InitialValues
+from simulation.advection import process_advection
+from simulation.kernels import KernelBackend, is_numba_available, process_weathering as compiled_weathering
+from simulation import simulation
+from simulation.parallel import SerialExecutor
+from simulation.point import Point, TopographyState
+from simulation.stations import WeatherStationGrid
+from simulation.utilities import Neighbourhood
+from simulation.weathering import process_weathering
+from simulation.world_state import WorldState
+from topology.file_loader import BinaryMapWindow, get_binary_map_window
+from topology.lands_loader import _get_lands, _get_map_window, is_land_at
+
+
+class _StationDataProcessor:
+    def weather_station_coordinates(self, _: Coordinates) -> DataStationInfo:
+        return DataStationInfo(latitude=0, longitude=0)
+
+    def weather_station_indices(self, lats: np.ndarray, lons: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        return np.zeros(len(lats), dtype=np.int64), np.zeros(len(lons), dtype=np.int64)
+
+    data_time_step = 1800
+    time_start = InitialValues.simulation_initial_parameters.time.min
+
+    def close(self) -> None:
+        pass
+
+    def get_station_measurements(self, _: int) -> StationMeasurements:
+        return StationMeasurements(wind=np.array([[[3.0, 4.0]]]), current=np.array([[[0.2, 0.1]]]),
+                                   temperature=np.array([[295.0]]))
+
+
+class _BenchmarkEngine:
+    def __init__(self, land_mask: np.ndarray):
+        self.land_mask = land_mask
+        self.data_processor = _StationDataProcessor()
+        self.station_grid = WeatherStationGrid(self.data_processor)
+
+    def get_topography(self, coord: tuple[int, int]) -> TopographyState:
+        is_land = self.is_land_many(np.array([coord[0]]), np.array([coord[1]]))[0]
+        return TopographyState.LAND if is_land else TopographyState.SEA
+
+    def is_land_many(self, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        return is_land_at(self.land_mask, xs, ys)
+
+
+def _initial_state(side: int) -> dict[str, np.ndarray]:
+    rng = np.random.default_rng(0)
+    cells = side * side
+    xs, ys = np.meshgrid(np.arange(side) + side // 2, np.arange(side) + side // 2)
+    return {
+        "coords": np.column_stack([xs.ravel(), ys.ravel()]),
+        "oil_mass": rng.uniform(100, 10000, cells),
+        "viscosity_dynamic": rng.uniform(0.5, 2, cells) * InitialValues.viscosity_dynamic,
+        "emulsification_rate": rng.uniform(0, 0.5, cells),
+        "temperature": rng.uniform(285, 305, cells),
+        "wind_velocity": rng.normal(0, 8, (cells, 2)),
+        "wave_velocity": rng.normal(0, 2, (cells, 2)),
+    }
+
+
+def _run_points(engine: _BenchmarkEngine, state: dict[str, np.ndarray]) -> tuple[float, float]:
+    Point.world = dict()
+    for i, (x, y) in enumerate(state["coords"].tolist()):
+        point = Point((x, y), engine)
+        point._oil_mass = state["oil_mass"][i]
+        point._viscosity_dynamic = state["viscosity_dynamic"][i]
+        point._emulsification_rate = state["emulsification_rate"][i]
+        point._temperature = state["temperature"][i]
+        point._wind_velocity = state["wind_velocity"][i]
+        point._wave_velocity = state["wave_velocity"][i]
+        Point.world[(x, y)] = point
+
+    start = perf_counter()
+    for point in list(Point.world.values()):
+        delta_y = point._process_emulsification()
+        delta_f, _ = point._process_evaporation()
+        point._process_natural_dispersion()
+        point._viscosity_change(delta_f, delta_y)
+        point._process_advection()
+    for point in Point.world.values():
+        point.pour_from_buffer()
+    elapsed = perf_counter() - start
+    # buffers of cells which got less than 1 kg are not poured
+    buffered = sum(mass for point in Point.world.values() for mass, _, _ in point.oil_buffer)
+    return elapsed, sum(point.oil_mass for point in Point.world.values()) + buffered
+
+
+def _run_backend(engine: _BenchmarkEngine, state: dict[str, np.ndarray], backend: KernelBackend) -> \
+        tuple[float, float]:
+    world = WorldState(engine)
+    slots = world.slots_of(state["coords"][:, 0], state["coords"][:, 1], create=True)
+    for name in ("oil_mass", "viscosity_dynamic", "emulsification_rate", "temperature", "wind_velocity",
+                 "wave_velocity"):
+        getattr(world, name)[slots] = state[name]
+    weathering = compiled_weathering if backend == KernelBackend.NUMBA else process_weathering
+
+    start = perf_counter()
+    weathering(world, slots)
+    process_advection(world, slots, SerialExecutor(), backend)
+    elapsed = perf_counter() - start
+    return elapsed, world.oil_mass[world.active_slots()].sum()
+
+
+def _benchmark_kernels(side: int):
+    InitialValues.point_side_lon_count = InitialValues.point_side_lat_count = 2 * side
+    InitialValues.top_left_coord = Coordinates(latitude=30.0, longitude=-90.0)
+    InitialValues.neighbourhood = Neighbourhood.MOORE
+    InitialValues.iter_as_sec = 600
+    InitialValues.point_side_size = 100
+    ys, xs = np.indices((2 * side, 2 * side))
+    engine = _BenchmarkEngine((np.abs(xs - ys) < 2).astype(np.uint8))
+    state = _initial_state(side)
+
+    reference_time, reference_mass = _run_points(engine, state)
+    print(f"{side * side} cells")
+    print(f"{'Point':>8}: {reference_time:8.3f} s")
+    backends = [KernelBackend.NUMPY] + ([KernelBackend.NUMBA] if is_numba_available() else [])
+    for backend in backends:
+        if backend == KernelBackend.NUMBA:
+            _run_backend(engine, _initial_state(2), backend)  # compilation
+        elapsed, mass = _run_backend(engine, state, backend)
+        print(f"{backend.value:>8}: {elapsed:8.3f} s, {reference_time / elapsed:7.1f}x, "
+              f"relative mass difference {abs(mass - reference_mass) / reference_mass:.1e}")
+    if not is_numba_available():
+        print("Numba is not installed, the numba backend was skipped")
+
+
+class _TimedExecutor:
+    """Measures the time spent in the tasks of an executor."""
+
+    def __init__(self, executor):
+        self._executor = executor
+        self.elapsed = 0.0
+
+    @property
+    def workers(self) -> int:
+        return self._executor.workers
+
+    def map(self, function, world, tasks: list[tuple]):
+        start = perf_counter()
+        results = self._executor.map(function, world, tasks)
+        self.elapsed += perf_counter() - start
+        return results
+
+    def close(self) -> None:
+        self._executor.close()
+
+
+def _time_steps(side: int, steps: int, **executor) -> tuple[float, float]:
+    engine = simulation.SimulationEngine(_StationDataProcessor(), **executor)
+    xs, ys = np.meshgrid(np.arange(side) + side // 2, np.arange(side) + side // 2)
+    for x, y in zip(xs.ravel().tolist(), ys.ravel().tolist()):
+        engine.world.add((x, y)).add_oil(1e6)
+    engine.update()  # starts the workers
+    engine.executor = timed_executor = _TimedExecutor(engine.executor)
+    start = perf_counter()
+    for _ in range(steps):
+        engine.update()
+    elapsed = perf_counter() - start
+    engine.close()
+    return elapsed / steps, timed_executor.elapsed / elapsed
+
+
+def _benchmark_steps(side: int, workers: int):
+    STEPS = 5
+    InitialValues.point_side_lon_count = InitialValues.point_side_lat_count = 2 * side
+    InitialValues.top_left_coord = Coordinates(latitude=28.0, longitude=-89.0)
+    InitialValues.neighbourhood = Neighbourhood.MOORE
+    InitialValues.point_side_size = 50
+    InitialValues.checkpoint_frequency = 0
+    ys, xs = np.indices((2 * side, 2 * side))
+    land_mask = (xs > 7 * side // 4).astype(np.uint8)
+    simulation.load_topography = lambda: land_mask  # a synthetic coast instead of the world map
+
+    print(f"{side * side} cells")
+    _time_steps(side, 1)  # warms up the caches of the grid
+    serial_time, parallel_share = _time_steps(side, STEPS)
+    # speedup of the whole step if the tasks ran on n workers with no overhead
+    bound = lambda n: 1 / (1 - parallel_share + parallel_share / n)
+    print(f"{'serial':>9}: {serial_time:.3f} s per step, {parallel_share:.0%} in tasks, so at most "
+          f"{bound(workers):.1f}x on {workers} and {bound(16):.1f}x on 16 workers")
+    for name, executor in (("threads", dict(workers=workers)), ("processes", dict(processes=workers))):
+        step_time, _ = _time_steps(side, STEPS, **executor)
+        print(f"{name:>9}: {step_time:.3f} s per step, {serial_time / step_time:.2f}x")
+
+
+def _reference_lands(binary_map: BinaryMapWindow) -> set[tuple[int, int]]:
+    height, width = binary_map.bits.shape
+    lands = set()
+    for x, y in product(range(binary_map.min_x, binary_map.min_x + width),
+                        range(binary_map.min_y, binary_map.min_y + height)):
+        if binary_map.bits[y - binary_map.min_y, x - binary_map.min_x] == 0:
+            lands.add((x, y))
+    return lands
+
+
+def _benchmark_topography():
+    area = InitialValues.simulation_initial_parameters.area
+    areas = {
+        "Gulf": (area.min.latitude, area.max.latitude, area.min.longitude, area.max.longitude),
+        "10x10": (20.0, 30.0, -95.0, -85.0)
+    }
+    for name, (InitialValues.min_lat, InitialValues.max_lat, InitialValues.min_lon, InitialValues.max_lon) in \
+            areas.items():
+        start = perf_counter()
+        binary_map = get_binary_map_window(*_get_map_window())
+        window_time = perf_counter() - start
+
+        start = perf_counter()
+        reference = _reference_lands(binary_map)
+        reference_time = perf_counter() - start
+
+        start = perf_counter()
+        xs, ys = _get_lands(binary_map)
+        lands_time = perf_counter() - start
+
+        identical = reference == set(zip(xs.tolist(), ys.tolist()))
+        print(f"{name:>6}: {binary_map.bits.size} pixels, {len(xs)} lands, window {window_time:.3f} s, "
+              f"per-pixel {reference_time:.3f} s, vectorized {lands_time:.4f} s, "
+              f"{reference_time / lands_time:.0f}x, identical: {identical}")
+
+
+def main():
+    mode = sys.argv[1] if len(sys.argv) > 1 else "kernels"
+    if mode == "topography":
+        _benchmark_topography()
+    elif mode == "step":
+        _benchmark_steps(int(sys.argv[2]) if len(sys.argv) > 2 else 400, int(sys.argv[3]) if len(sys.argv) > 3 else 4)
+    else:
+        _benchmark_kernels(int(sys.argv[2]) if len(sys.argv) > 2 else 100)
+
+
+if __name__ == "__main__":
+    main()
@@ -102,14 +102,11 @@ def load_from_json(path: str) -> dict[str, Any]:
 
 def initialize_points_from_checkpoint(points: list[Any], engine):
     logger.debug("STARTED: Initializing points from checkpoint")
-    world = {}
+    engine.world = {}
     for point_data in points:
-        point_coord = tuple(point_data["coord"])
-        point = Point(point_coord, engine)
+        point = engine.world.add(tuple(point_data["coord"]))
         point.oil_mass = point_data["oil_mass"]
         point.evaporation_rate = point_data["evaporation_rate"]
         point.emulsification_rate = point_data["emulsification_rate"]
         point.viscosity_dynamic = point_data["viscosity_dynamic"]
-        world[point_coord] = point
     logger.debug("FINISHED: Initializing points from checkpoint")
-    engine.world = world
@@ -1,6 +1,14 @@
+import numpy as np
+
 COLOR_RANGE_MAX = 255.0
 
 
 def blend_color(color1, color2, ratio) -> tuple[int, ...]:
     ratio = min(ratio, 1)
     return tuple(int(color1[i] * ratio + color2[i] * (1 - ratio)) for i in range(len(color1)))
+
+
+def blend_colors(color1, color2, ratios: np.ndarray) -> np.ndarray:
+    """blend_color of many ratios, returns (ratio, channel) uint8 colors."""
+    ratios = np.minimum(ratios, 1)[:, None]
+    return (np.array(color1) * ratios + np.array(color2) * (1 - ratios)).astype(np.uint8)
@@ -1,24 +1,30 @@
+import hashlib
+import json
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 from dataclasses import dataclass
 from enum import Enum
 from logging import getLogger
 from math import floor
-from os import PathLike, path, listdir, mkdir
-from typing import Optional
+from os import PathLike, getpid, listdir, path, replace, utime
+from pathlib import Path
+from shutil import rmtree
+from typing import IO, Callable, Optional
 
 import numpy as np
 import pandas as pd
-from scipy.interpolate import NearestNDInterpolator
+from scipy.spatial import cKDTree
 
 from data.generic import Range
 from data.measurement_data import CertainMeasurement, Coordinates, SpeedMeasure, CoordinatesBase, average_measurement
 from data.simulation_run_parameters import SimulationRunParameters
-from data.utilities import dataframe_replace_apply, minutes, round_values, celcius_to_kelvins
-from files import get_processed_data_path
+from data.utilities import minutes, round_values, celcius_to_kelvins
+from files import get_processed_data_path, get_processed_environment_header_path, get_processed_environment_path
+from initial_values import InitialValues
+from simulation.utilities import PreprocessingMode
 from topology.math import coordinates_distance
 
 logger = getLogger("data")
 
-MINUTES_IN_HOUR = 60
 SECONDS_IN_MINUTE = 60
 
 DataStationInfo = CoordinatesBase[int]
@@ -78,42 +84,115 @@ class DataAggregationDescriptor(Enum):
 
 
 @dataclass
-class LoadedData:
-    measurements_data: dict
-
-    @staticmethod
-    def from_dataframe(data: pd.DataFrame) -> 'LoadedData':
-        get_measurement = lambda row: CertainMeasurement(
-            wind=SpeedMeasure(row.wind_n, row.wind_e),
-            current=SpeedMeasure(row.current_n, row.current_e),
-            temperature=row.temp
-        )
+class StationMeasurements:
+    wind: np.ndarray  # (latitude, longitude, 2) north and east speed at every station
+    current: np.ndarray  # (latitude, longitude, 2)
+    temperature: np.ndarray  # (latitude, longitude)
+
+
+MEASUREMENT_VARIABLES = (DataAggregationDescriptor.WIND_N, DataAggregationDescriptor.WIND_E,
+                         DataAggregationDescriptor.CURRENT_N, DataAggregationDescriptor.CURRENT_E,
+                         DataAggregationDescriptor.TEMPERATURE)
+DEFAULT_MEASUREMENT = (0, 0, 0, 0, 302.15)
+# variables measured together, they share the sample points of the interpolation
+INTERPOLATION_GROUPS = ((DataAggregationDescriptor.WIND_N, DataAggregationDescriptor.WIND_E),
+                        (DataAggregationDescriptor.CURRENT_N, DataAggregationDescriptor.CURRENT_E),
+                        (DataAggregationDescriptor.TEMPERATURE,))
+
+
+def _nearest_values(tree: cKDTree, values: np.ndarray, time_points: np.ndarray, latitude_points: np.ndarray,
+                    longitude_points: np.ndarray) -> np.ndarray:
+    """
+    Nearest neighbour interpolation of (points of the tree, variable) values over the (time, latitude, longitude,
+    variable) grid, the tree is queried once for all the variables.
+    """
+    grid = np.stack(np.meshgrid(time_points, latitude_points, longitude_points, indexing="ij"), axis=-1)
+    _, nearest = tree.query(grid.reshape(-1, 3))
+    return values[nearest].reshape(grid.shape[:-1] + (values.shape[1],))
+
+
+def _interpolate_group(points: np.ndarray, values: np.ndarray, time_points: np.ndarray, latitude_points: np.ndarray,
+                       longitude_points: np.ndarray) -> np.ndarray:
+    return _nearest_values(cKDTree(points), values, time_points, latitude_points, longitude_points)
+
+
+def _save_atomically(file_path: Path, save: Callable[[IO], None], mode: str) -> None:
+    temporary_path = file_path.with_name(f"{file_path.name}.{getpid()}.tmp")
+    with open(temporary_path, mode) as file:
+        save(file)
+    replace(temporary_path, file_path)  # readers never see a partially written file
+
+
+def _evict_processed_data(kept_key: str) -> None:
+    """
+    Removes the least recently used preprocessed data of other runs until all of it fits in
+    InitialValues.processed_data_max_size.
+    """
+    entries = []  # (last use, size, directory)
+    for directory in get_processed_data_path().iterdir():
+        try:
+            if directory.is_dir() and directory.name != kept_key:
+                stats = [file.stat() for file in directory.iterdir()]
+                entries.append((max((stat.st_mtime for stat in stats), default=0),
+                                sum(stat.st_size for stat in stats), directory))
+        except OSError:  # removed by another run meanwhile
+            continue
+    kept_size = sum(file.stat().st_size for file in get_processed_data_path().joinpath(kept_key).glob("*"))
+    total_size = kept_size + sum(size for _, size, _ in entries)
+    for _, size, directory in sorted(entries):
+        if total_size <= InitialValues.processed_data_max_size:
+            break
+        try:
+            rmtree(directory)
+            total_size -= size
+            logger.debug(f"Removed preprocessed data {directory}")
+        except OSError as error:
+            logger.warning(f"Could not remove preprocessed data {directory}: {error}")
 
-        return LoadedData({(row.time, row.lat, row.lon): get_measurement(row) for row in data.itertuples()})
 
-    def try_get_measurement(self, time: float, latitude: float, longitude: float) -> SpeedMeasure:
-        measure = self.measurements_data.get((time, latitude, longitude))
+@dataclass
+class LoadedData:
+    measurements: np.ndarray  # (time index, latitude index, longitude index, variable) of MEASUREMENT_VARIABLES
+    first_time_index: int
 
-        if measure is None:
+    def try_get_measurement(self, time_index: int, latitude_index: int, longitude_index: int) -> CertainMeasurement:
+        local_time_index = time_index - self.first_time_index
+        if 0 <= local_time_index < len(self.measurements):
+            values = self.measurements[local_time_index, latitude_index, longitude_index].tolist()
+        else:
             logger.warning(
-                f"can't parse measurement for given coordinates {(latitude, longitude)} and time stamp {time}")
-            DEFAULT_SPEED = SpeedMeasure(0, 0)
-            DEFAULT_TEMPERATURE = 302.15
-            return CertainMeasurement(DEFAULT_SPEED, DEFAULT_SPEED, DEFAULT_TEMPERATURE)
-
-        return measure
+                f"can't parse measurement for given station {(latitude_index, longitude_index)} and time index "
+                f"{time_index}")
+            values = DEFAULT_MEASUREMENT
+        wind_n, wind_e, current_n, current_e, temperature = values
+        return CertainMeasurement(SpeedMeasure(wind_n, wind_e), SpeedMeasure(current_n, current_e), temperature)
+
+    def get_station_measurements(self, time_index: int) -> StationMeasurements:
+        local_time_index = time_index - self.first_time_index
+        if 0 <= local_time_index < len(self.measurements):
+            values = self.measurements[local_time_index]
+        else:
+            logger.warning(f"can't parse measurements of stations for time index {time_index}")
+            values = np.broadcast_to(np.array(DEFAULT_MEASUREMENT, dtype=np.float32), self.measurements.shape[1:])
+        return StationMeasurements(wind=values[..., 0:2], current=values[..., 2:4], temperature=values[..., 4])
 
 
 class DataProcessorImpl:
-    def __init__(self, csv_paths: list[PathLike], simulation_run_parameters: SimulationRunParameters):
+    PREFETCH_HOURS = 2
+
+    def __init__(self, csv_paths: list[PathLike], simulation_run_parameters: SimulationRunParameters,
+                 processes: int = 1, mode: PreprocessingMode = PreprocessingMode.EAGER):
         logger.debug("STARTED: Preprocessing data...")
+        # listdir lists the files in arbitrary order, which must not change the data or its cache key
+        csv_paths = sorted(csv_paths, key=str)
 
-        self.loaded_data: dict[int, pd.DataFrame] = {}
+        self._loaded_hours: dict[int, Future] = dict()  # simulation hour -> LoadedData of the hour
+        self._executor = ThreadPoolExecutor(1)
 
         self.run_parameters = simulation_run_parameters
-        data = self._load_all_data(csv_paths)
+        self.data_time_step = int(simulation_run_parameters.data_time_step.total_seconds())  # [s]
 
-        time_points = self._create_environment_time_range(simulation_run_parameters)
+        self._time_points = self._create_environment_time_range(simulation_run_parameters)
         self.latitude_points = self._create_environment_latitude_range(simulation_run_parameters)
         self.longitude_points = self._create_environment_longitude_range(simulation_run_parameters)
 
@@ -132,92 +211,59 @@ class DataProcessorImpl:
                 self.longitude_points)) / simulation_run_parameters.interpolation_grid_size.longitude
         )
 
-        time_points, latitude_points, longitude_points = np.meshgrid(time_points, self.latitude_points,
-                                                                     self.longitude_points)
-
-        points_wind_n, values_wind_n = self._get_interpolation_area(data, DataAggregationDescriptor.WIND_N,
-                                                                    DataAggregationDescriptor.WIND_E)
-        wind_n_interpolated = self._get_interpolated_data(time_points, latitude_points, longitude_points, points_wind_n,
-                                                          values_wind_n)
-
-        points_wind_e, values_wind_e = self._get_interpolation_area(data, DataAggregationDescriptor.WIND_E,
-                                                                    DataAggregationDescriptor.WIND_N)
-        wind_e_interpolated = self._get_interpolated_data(time_points, latitude_points, longitude_points, points_wind_e,
-                                                          values_wind_e)
-
-        points_current_n, values_current_n = self._get_interpolation_area(data, DataAggregationDescriptor.CURRENT_N,
-                                                                          DataAggregationDescriptor.CURRENT_E)
-        current_n_interpolated = self._get_interpolated_data(time_points, latitude_points, longitude_points,
-                                                             points_current_n, values_current_n)
-
-        points_current_e, values_current_e = self._get_interpolation_area(data, DataAggregationDescriptor.CURRENT_E,
-                                                                          DataAggregationDescriptor.CURRENT_N)
-        current_e_interpolated = self._get_interpolated_data(time_points, latitude_points, longitude_points,
-                                                             points_current_e, values_current_e)
-
-        points_temp, values_temp = self._get_interpolation_area(data, DataAggregationDescriptor.TEMPERATURE)
-        values_temp = np.vectorize(celcius_to_kelvins)(values_temp)
-        temp_interpolated = self._get_interpolated_data(time_points, latitude_points, longitude_points, points_temp,
-                                                        values_temp)
-
-        environment_area = pd.DataFrame(
-            {
-                DataAggregationDescriptor.TIME_STAMP.value: time_points.flatten(),
-                DataAggregationDescriptor.LATITUDE.value: latitude_points.flatten(),
-                DataAggregationDescriptor.LONGITUDE.value: longitude_points.flatten(),
-                DataAggregationDescriptor.WIND_N.value: wind_n_interpolated.flatten(),
-                DataAggregationDescriptor.WIND_E.value: wind_e_interpolated.flatten(),
-                DataAggregationDescriptor.CURRENT_N.value: current_n_interpolated.flatten(),
-                DataAggregationDescriptor.CURRENT_E.value: current_e_interpolated.flatten(),
-                DataAggregationDescriptor.TEMPERATURE.value: temp_interpolated.flatten()
-            }
-        )
-
-        environment_area.sort_values(inplace=True, by=[DataAggregationDescriptor.TIME_STAMP.value])
+        # runs over the same data and parameters share the preprocessed data, in both modes
+        self._cache_key = self._get_cache_key(csv_paths)
+        self._environment = self._load_environment()
+        if self._environment is not None:
+            logger.debug(f"FINISHED: Preprocessed data loaded from {get_processed_data_path()}/{self._cache_key}")
+            return
 
+        data = self._load_all_data(csv_paths)
+        groups = []
+        for columns in INTERPOLATION_GROUPS:
+            points, values = self._get_interpolation_area(data, columns)
+            if columns == (DataAggregationDescriptor.TEMPERATURE,):
+                values = celcius_to_kelvins(values)
+            groups.append((points, values))
+
+        if mode == PreprocessingMode.LAZY:
+            self._groups = [(cKDTree(points), values) for points, values in groups]
+        else:
+            self._interpolate_all(groups, processes)
         logger.debug("FINISHED: Preprocessing data...")
-        path_to_save = get_processed_data_path()
-        if not path.exists(path_to_save):
-            logger.debug(f"Creating directory {path_to_save}")
-            mkdir(path_to_save)
-        logger.debug(f"STARTED: Saving preprocessed data to {path_to_save}...")
-
-        # TODO: code below is a mess probably need to be refactored in the future
-        to_save = pd.DataFrame()
 
-        hour = 0
-        last_minutes = -1
-
-        get_data_path = lambda: path.join(path_to_save, f"{hour}.csv")
+    def _interpolate_all(self, groups: list[tuple[np.ndarray, np.ndarray]], processes: int) -> None:
+        grid = (self._time_points, self.latitude_points, self.longitude_points)
+        if processes > 1:
+            with ProcessPoolExecutor(min(processes, len(groups))) as executor:
+                interpolated = list(executor.map(_interpolate_group, *zip(*[group + grid for group in groups])))
+        else:
+            interpolated = [_interpolate_group(*group, *grid) for group in groups]
+        environment = np.concatenate(interpolated, axis=-1).astype(np.float32)
+        self._save_environment(environment)
+        saved_environment = self._load_environment()
+        self._environment = saved_environment if saved_environment is not None else environment
 
-        for _, row in environment_area.iterrows():
-            time = row[DataAggregationDescriptor.TIME_STAMP.value]
-            if time > 0 and time % MINUTES_IN_HOUR == 0 and last_minutes != time:
-                to_save.to_csv(get_data_path(), index=False)
-                to_save = pd.DataFrame()
-                logger.info(f"saved: {hour} hour")
-                hour += 1
-            last_minutes = time
-            to_save = pd.concat([to_save, pd.DataFrame([row])], ignore_index=True)
-        to_save.to_csv(get_data_path(), index=False)
-        logger.info(f"saved: {hour} hour")
+    def _interpolate_hour(self, simulation_hour: int) -> np.ndarray:
+        first_time_index, last_time_index = self._get_time_indices_for_hour(simulation_hour)
+        time_points = self._time_points[first_time_index:last_time_index]
+        return np.concatenate([_nearest_values(tree, values, time_points, self.latitude_points, self.longitude_points)
+                               for tree, values in self._groups], axis=-1).astype(np.float32)
 
-        logger.debug("FINISHED: Saving preprocessed data...")
-
-    def should_update_data(self, time_from_last_update: pd.Timedelta) -> bool:
-        return time_from_last_update > self.run_parameters.data_time_step
+    def should_update_data(self, time_from_last_update: int) -> bool:
+        return time_from_last_update > self.data_time_step
 
     def get_measurement(self, coordinates: Coordinates, nearest_station_info: DataStationInfo,
-                        time_stamp: pd.Timestamp) -> CertainMeasurement:
+                        time: int) -> CertainMeasurement:
         SHOULD_INTERPOLATE = False
 
-        loaded_data = self._get_data_for_time(time_stamp)
-        time_stamp = self._get_nearest_data_time(time_stamp)
+        loaded_data = self._get_data_for_time(time)
+        time = self._get_nearest_data_time(time)
 
         station_coordinates = self._get_coord_for_station(nearest_station_info)
 
         if not SHOULD_INTERPOLATE or coordinates == station_coordinates:
-            return self._get_certain_measurement(loaded_data, station_coordinates, time_stamp)
+            return self._get_certain_measurement(loaded_data, nearest_station_info, time)
 
         interpolation_neighbours = self._get_direction_of_station(coordinates,
                                                                   station_coordinates).get_interpolation_neighbours()
@@ -225,8 +271,8 @@ class DataProcessorImpl:
         neighbours_stations_coords = [self._get_coord_for_station(station_info) for station_info in
                                       neighbours_stations_info]
         weights = [coordinates_distance(coordinates, coord) for coord in neighbours_stations_coords]
-        measurements = [self._get_certain_measurement(loaded_data, coord, time_stamp) for coord in
-                        neighbours_stations_coords]
+        measurements = [self._get_certain_measurement(loaded_data, station_info, time) for station_info in
+                        neighbours_stations_info]
 
         return CertainMeasurement(
             wind=SpeedMeasure.from_average([measurement.wind for measurement in measurements], weights),
@@ -234,6 +280,10 @@ class DataProcessorImpl:
             temperature=average_measurement([measurement.temperature for measurement in measurements], weights)
         )
 
+    def get_station_measurements(self, time: int) -> StationMeasurements:
+        loaded_data = self._get_data_for_time(time)
+        return loaded_data.get_station_measurements(self._get_nearest_data_time(time) // self.data_time_step)
+
     def _get_coord_for_station(self, station_info: DataStationInfo) -> Coordinates:
         return Coordinates(
             self.latitude_points[station_info.latitude],
@@ -269,74 +319,123 @@ class DataProcessorImpl:
 
         return DataStationInfo(lat_candidate, lon_candidate)
 
-    def _get_certain_measurement(self, data: LoadedData, coordinates: Coordinates,
-                                 time_stamp: pd.Timestamp) -> CertainMeasurement:
-        delta = minutes(time_stamp - self.run_parameters.time.min)
-        return data.try_get_measurement(delta, coordinates.latitude, coordinates.longitude)
-
-    def _get_nearest_data_time(self, time_stamp: pd.Timestamp) -> pd.Timestamp:
-        duration_till_start = time_stamp - self.run_parameters.time.min
-        time_stamps_passed = duration_till_start / self.run_parameters.data_time_step
-        return self.run_parameters.time.min + (floor(time_stamps_passed) * self.run_parameters.data_time_step)
-
-    def _get_data_for_time(self, time_stamp: pd.Timestamp) -> LoadedData:
-        needed_hour = self._get_run_hour_for_time_stamp(time_stamp)
-
-        if len(self.loaded_data) == 0:
-            self._load_data_for_time(needed_hour)
-
-        first_loaded_hour = next(iter(self.loaded_data.keys()))
-        if needed_hour > first_loaded_hour:
-            self.loaded_data.pop(first_loaded_hour)
-            return self._get_data_for_time(time_stamp)
-
-        # TODO: preloading next data <- could be done in another process?
-        PRELOAD_FACTOR = 2
-        ONLY_ONE_HOUR_LEFT_COUNT = 1
-        if len(self.loaded_data) == ONLY_ONE_HOUR_LEFT_COUNT and (
-                time_stamp + (self.run_parameters.data_time_step / PRELOAD_FACTOR)).hour > time_stamp.hour:
-            self._load_data_for_time(first_loaded_hour + 1)
-
-        return next(iter(self.loaded_data.values()))
-
-    def _get_run_hour_for_time_stamp(self, time_stamp: pd.Timestamp) -> int:
+    def _get_certain_measurement(self, data: LoadedData, station_info: DataStationInfo,
+                                 time: int) -> CertainMeasurement:
+        return data.try_get_measurement(time // self.data_time_step, station_info.latitude, station_info.longitude)
+
+    def _get_nearest_data_time(self, time: int) -> int:
+        return time // self.data_time_step * self.data_time_step
+
+    def _get_data_for_time(self, time: int) -> LoadedData:
+        """
+        Hours are loaded by a background thread, the needed one and PREFETCH_HOURS after it, so they are usually ready
+        when the simulation gets to them. Hours behind the simulation are dropped. The needed hour is the one of the
+        nearest data time, which is in an earlier hour than the time when the data time step does not divide an hour.
+        """
+        needed_hour = self._get_run_hour_for_time(self._get_nearest_data_time(time))
+        hours = range(needed_hour, needed_hour + 1 + self.PREFETCH_HOURS)
+        for hour in [hour for hour in self._loaded_hours if hour not in hours]:
+            self._loaded_hours.pop(hour).cancel()
+        for hour in hours:
+            if hour not in self._loaded_hours:
+                self._loaded_hours[hour] = self._executor.submit(self._load_data_for_time, hour)
+        return self._loaded_hours[needed_hour].result()
+
+    def close(self) -> None:
+        """Stops the background loading of hours, the data can not be read afterwards."""
+        self._executor.shutdown(cancel_futures=True)
+        self._loaded_hours.clear()
+
+    def _get_run_hour_for_time(self, time: int) -> int:
         SECONDS_IN_HOUR = 3600
-        return int((time_stamp - self.run_parameters.time.min).total_seconds()) // SECONDS_IN_HOUR
+        return int(time) // SECONDS_IN_HOUR
 
-    def _load_data_for_time(self, simulation_hour: int) -> None:
-        read_data = self._read_data_for_time(simulation_hour)
-        if read_data is not None:
-            self.loaded_data[simulation_hour] = LoadedData.from_dataframe(read_data)
+    def _get_time_indices_for_hour(self, simulation_hour: int) -> tuple[int, int]:
+        SECONDS_IN_HOUR = 3600
+        first_time_index = min(-(-simulation_hour * SECONDS_IN_HOUR // self.data_time_step), len(self._time_points))
+        last_time_index = min(-(-(simulation_hour + 1) * SECONDS_IN_HOUR // self.data_time_step),
+                              len(self._time_points))
+        return first_time_index, last_time_index
 
-    def _read_data_for_time(self, simulation_hour: int) -> Optional[pd.DataFrame]:
+    def _load_data_for_time(self, simulation_hour: int) -> LoadedData:
         logger.debug(f"Reading data for hour {simulation_hour}")
-        data_path = path.join(get_processed_data_path(), f"{simulation_hour}.csv")
-        return pd.read_csv(data_path) if path.exists(data_path) else None
-
-    def _get_interpolated_data(self, time_points: np.array, latitude_points: np.array, longitude_points: np.array,
-                               points: np.array, values: np.array) -> np.array:
-        interpolator = NearestNDInterpolator(points, values)
-        return interpolator(time_points, latitude_points, longitude_points)
-
-    def _get_interpolation_area(self, data: pd.DataFrame, column_filter: DataAggregationDescriptor,
-                                additional_filter: DataAggregationDescriptor = None) -> tuple[np.ndarray, np.ndarray]:
-        points: list[list] = []
-        values: list[float] = []
-
-        if additional_filter is not None:
-            data_with_column = data[data[column_filter.value].notna() & data[additional_filter.value].notna()]
+        first_time_index, last_time_index = self._get_time_indices_for_hour(simulation_hour)
+        if first_time_index >= last_time_index:
+            measurements = np.zeros((0, len(self.latitude_points), len(self.longitude_points),
+                                     len(MEASUREMENT_VARIABLES)), dtype=np.float32)
+        elif self._environment is not None:
+            measurements = np.array(self._environment[first_time_index:last_time_index])
         else:
-            data_with_column = data[data[column_filter.value].notna()]
+            measurements = self._interpolate_hour(simulation_hour)
+        return LoadedData(measurements, first_time_index)
+
+    def _get_cache_key(self, csv_paths: list[PathLike]) -> str:
+        """Hash of the contents of the data files and of the run parameters, names the preprocessed data directory."""
+        CACHE_VERSION = 1  # bump when the preprocessing changes
+        CHUNK_SIZE = 1 << 20
+        digest = hashlib.sha256(repr((CACHE_VERSION, self.run_parameters)).encode())
+        for csv_path in csv_paths:
+            digest.update(str(path.getsize(csv_path)).encode())
+            with open(csv_path, "rb") as file:
+                while chunk := file.read(CHUNK_SIZE):
+                    digest.update(chunk)
+        return digest.hexdigest()[:32]
+
+    def _save_environment(self, environment: np.ndarray) -> None:
+        path_to_save = get_processed_environment_path(self._cache_key).parent
+        logger.debug(f"STARTED: Saving preprocessed data to {path_to_save}...")
+        header = {
+            "axes": ["time", "latitude", "longitude", "variable"],
+            "time_start": str(self.run_parameters.time.min),
+            "time_step": self.data_time_step,
+            "latitude": self.latitude_points.tolist(),
+            "longitude": self.longitude_points.tolist(),
+            "variables": [variable.value for variable in MEASUREMENT_VARIABLES]
+        }
+        try:
+            path_to_save.mkdir(parents=True, exist_ok=True)
+            _save_atomically(get_processed_environment_path(self._cache_key),
+                             lambda file: np.save(file, environment), "wb")
+            # the header is written last, data with a header is complete
+            _save_atomically(get_processed_environment_header_path(self._cache_key),
+                             lambda file: json.dump(header, file, indent=4), "w")
+            _evict_processed_data(self._cache_key)
+        except OSError as error:
+            logger.warning(f"Could not save preprocessed data to {path_to_save}: {error}")
+        logger.debug("FINISHED: Saving preprocessed data...")
 
-        for _, row in data_with_column.iterrows():
-            lat = row[DataAggregationDescriptor.LATITUDE.value]
-            lon = row[DataAggregationDescriptor.LONGITUDE.value]
-            time = row[DataAggregationDescriptor.TIME_STAMP.value]
-            time_from_start = minutes(time - self.run_parameters.time.min)
-            points.append((time_from_start, lat, lon))
-            values.append(row[column_filter.value])
+    def _load_environment(self) -> Optional[np.ndarray]:
+        """Memory-maps the preprocessed (time, latitude, longitude, variable) environment of the run, if it is saved."""
+        header_path = get_processed_environment_header_path(self._cache_key)
+        if not header_path.exists():
+            return None
+        try:
+            with open(header_path, "r") as file:
+                header = json.load(file)
+            environment = np.load(get_processed_environment_path(self._cache_key), mmap_mode="r")
+            utime(header_path)  # the data is recently used for the eviction
+        except (OSError, ValueError) as error:
+            logger.warning(f"Could not load preprocessed data {header_path.parent}: {error}")
+            return None
+        expected_shape = (len(self._time_points), len(self.latitude_points), len(self.longitude_points),
+                          len(MEASUREMENT_VARIABLES))
+        if header.get("variables") != [variable.value for variable in MEASUREMENT_VARIABLES] or \
+                header.get("time_step") != self.data_time_step or environment.shape != expected_shape:
+            logger.warning(f"Preprocessed data in {header_path.parent} does not match the run")
+            return None
+        return environment
+
+    def _get_interpolation_area(self, data: pd.DataFrame, columns: tuple[DataAggregationDescriptor, ...]) -> \
+            tuple[np.ndarray, np.ndarray]:
+        """Returns (time, latitude, longitude) points of the rows with all the columns and (points, column) values."""
+        data_with_columns = data[data[[column.value for column in columns]].notna().all(axis=1)]
 
-        return np.array(points), np.array(values)
+        time_from_start = (data_with_columns[DataAggregationDescriptor.TIME_STAMP.value] -
+                           self.run_parameters.time.min).dt.total_seconds() / SECONDS_IN_MINUTE
+        points = np.column_stack([time_from_start.to_numpy(dtype=float),
+                                  data_with_columns[DataAggregationDescriptor.LATITUDE.value].to_numpy(dtype=float),
+                                  data_with_columns[DataAggregationDescriptor.LONGITUDE.value].to_numpy(dtype=float)])
+        return points, data_with_columns[[column.value for column in columns]].to_numpy(dtype=float)
 
     def _create_environment_latitude_range(self, simulation_run_parameters: SimulationRunParameters) -> np.array:
         latitude_range = Range(simulation_run_parameters.area.min.latitude, simulation_run_parameters.area.max.latitude)
@@ -372,43 +471,29 @@ class DataProcessorImpl:
         return concatenated_data
 
     def _data_agg_time(self, data: pd.DataFrame):
-        def get_time_stamp(*args):
-            return pd.Timestamp(*[int(arg) for arg in args])
-
-        dataframe_replace_apply(
-            dataframe=data,
-            result_columns=[DataAggregationDescriptor.TIME_STAMP.value],
-            function=get_time_stamp,
-            columns=[
-                DataDescriptor.YEAR.value,
-                DataDescriptor.MONTH.value,
-                DataDescriptor.DAY.value,
-                DataDescriptor.HOUR.value,
-                DataDescriptor.MINUTE.value
-            ]
-        )
+        date_columns = [DataDescriptor.YEAR.value, DataDescriptor.MONTH.value, DataDescriptor.DAY.value,
+                        DataDescriptor.HOUR.value, DataDescriptor.MINUTE.value]
+        # to_datetime assembles dates from columns with these names, rows with a missing part get NaT
+        date_parts = data[date_columns].set_axis(["year", "month", "day", "hour", "minute"], axis=1)
+        data[DataAggregationDescriptor.TIME_STAMP.value] = pd.to_datetime(date_parts)
+        data.drop(columns=date_columns, inplace=True)
 
     def _data_agg_wind(self, data: pd.DataFrame):
-        dataframe_replace_apply(
-            dataframe=data,
-            result_columns=[DataAggregationDescriptor.WIND_N.value, DataAggregationDescriptor.WIND_E.value],
-            function=SpeedMeasure.from_direction,
-            columns=[
-                DataDescriptor.WIND_SPEED.value,
-                DataDescriptor.WIND_DIRECTION.value
-            ]
-        )
+        self._data_agg_speed(data, DataDescriptor.WIND_SPEED, DataDescriptor.WIND_DIRECTION,
+                             DataAggregationDescriptor.WIND_N, DataAggregationDescriptor.WIND_E)
 
     def _data_agg_current(self, data: pd.DataFrame):
-        dataframe_replace_apply(
-            dataframe=data,
-            result_columns=[DataAggregationDescriptor.CURRENT_N.value, DataAggregationDescriptor.CURRENT_E.value],
-            function=SpeedMeasure.from_direction,
-            columns=[
-                DataDescriptor.CURRENT_SPEED.value,
-                DataDescriptor.CURRENT_DIRECTION.value
-            ]
-        )
+        self._data_agg_speed(data, DataDescriptor.CURRENT_SPEED, DataDescriptor.CURRENT_DIRECTION,
+                             DataAggregationDescriptor.CURRENT_N, DataAggregationDescriptor.CURRENT_E)
+
+    def _data_agg_speed(self, data: pd.DataFrame, speed_column: DataDescriptor, direction_column: DataDescriptor,
+                        north_column: DataAggregationDescriptor, east_column: DataAggregationDescriptor):
+        """Same as SpeedMeasure.from_direction for whole columns, NaN where the speed or the direction is missing."""
+        speed = data[speed_column.value].to_numpy(dtype=float)
+        direction = np.radians(data[direction_column.value].to_numpy(dtype=float))
+        data[north_column.value] = speed * np.cos(direction)
+        data[east_column.value] = speed * np.sin(direction)
+        data.drop(columns=[speed_column.value, direction_column.value], inplace=True)
 
     def weather_station_coordinates(self, coordinates: Coordinates) -> DataStationInfo:
         coords = CoordinatesBase(
@@ -423,21 +508,51 @@ class DataProcessorImpl:
                           floor(coords.longitude / self.coord_range.longitude))
         )
 
+    def weather_station_indices(self, lats: np.ndarray, lons: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        station_lats = np.floor(np.maximum(0, lats - self.min_coords.latitude) / self.coord_range.latitude)
+        station_lons = np.floor(np.maximum(0, lons - self.min_coords.longitude) / self.coord_range.longitude)
+        return np.minimum(self.run_parameters.interpolation_grid_size.latitude - 1, station_lats).astype(np.int64), \
+            np.minimum(self.run_parameters.interpolation_grid_size.longitude - 1, station_lons).astype(np.int64)
+
 
 class DataProcessor:
     def __init__(self, *args):
         self._impl = DataProcessorImpl(*args)
 
     def get_measurement(self, coordinates: Coordinates, nearest_station_info: DataStationInfo,
-                        time_stamp: pd.Timestamp) -> CertainMeasurement:
-        return self._impl.get_measurement(coordinates, nearest_station_info, time_stamp)
-
-    def should_update_data(self, time_from_last_update: pd.Timedelta) -> bool:
+                        time: int) -> CertainMeasurement:
+        """
+        Time is given in seconds since time_start of the data. It is the simulation start, except for runs resumed from
+        a checkpoint, which preprocess only the data after it.
+        """
+        return self._impl.get_measurement(coordinates, nearest_station_info, time)
+
+    def should_update_data(self, time_from_last_update: int) -> bool:
         return self._impl.should_update_data(time_from_last_update)
 
+    def get_station_measurements(self, time: int) -> StationMeasurements:
+        """Measurements of all weather stations at the given time, like get_measurement of every station."""
+        return self._impl.get_station_measurements(time)
+
+    def close(self) -> None:
+        self._impl.close()
+
+    @property
+    def data_time_step(self) -> int:
+        """[s]"""
+        return self._impl.data_time_step
+
+    @property
+    def time_start(self) -> pd.Timestamp:
+        return self._impl.run_parameters.time.min
+
     def weather_station_coordinates(self, coordinates: Coordinates) -> DataStationInfo:
         return self._impl.weather_station_coordinates(coordinates)
 
+    def weather_station_indices(self, lats: np.ndarray, lons: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Vectorized weather_station_coordinates, returns latitude and longitude indices of the stations."""
+        return self._impl.weather_station_indices(lats, lons)
+
 
 class DataValidationException(Exception):
     pass
@@ -482,8 +597,9 @@ class DataReader:
         IS_CSV = lambda file: file.endswith(CSV_EXT)
 
         self._data_validator.validate_dir(dir_path)
-        for file in filter(IS_CSV, listdir(dir_path)):
+        for file in sorted(filter(IS_CSV, listdir(dir_path))):
             self.add_data(path.join(dir_path, file))
 
-    def preprocess(self, simulation_run_parameters: SimulationRunParameters) -> DataProcessor:
-        return DataProcessor(self._dataset_paths, simulation_run_parameters)
+    def preprocess(self, simulation_run_parameters: SimulationRunParameters, processes: int = 1,
+                   mode: PreprocessingMode = PreprocessingMode.EAGER) -> DataProcessor:
+        return DataProcessor(self._dataset_paths, simulation_run_parameters, processes, mode)
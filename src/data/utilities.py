@@ -1,4 +1,4 @@
-from typing import Callable, Optional
+from typing import Optional
 
 import numpy as np
 import pandas as pd
@@ -11,31 +11,6 @@ def minutes(time_delta: pd.Timedelta) -> float:
     return time_delta.total_seconds() / SECONDS_IN_MINUTE
 
 
-def dataframe_replace_apply(dataframe: pd.DataFrame, result_columns: list[str], function: Callable, columns: list[str]):
-    def is_any_nan(row: pd.Series) -> bool:
-        return any([pd.isna(row[column]) for column in columns])
-
-    def apply_function(row: pd.Series) -> object:
-        return pd.NA if is_any_nan(row) else function(*[row[column] for column in columns])
-
-    result = dataframe.apply(
-        lambda row: apply_function(row),
-        axis=1
-    )
-
-    SINGLE_RESULT_COLUMNS_COUNT = 1
-    if len(result_columns) == SINGLE_RESULT_COLUMNS_COUNT:
-        dataframe[result_columns[0]] = result
-    else:
-        for i in range(len(result_columns)):
-            dataframe[result_columns[i]] = result.apply(lambda x: x[i] if not pd.isna(x) else pd.NA)
-
-    dataframe.drop(
-        columns=columns,
-        inplace=True
-    )
-
-
 def or_default(value: Optional[object], default: object) -> object:
     if value is None:
         return default
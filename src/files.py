@@ -9,6 +9,14 @@ def get_processed_data_path() -> Path:
     return get_main_path().joinpath("data/processed_data")
 
 
+def get_processed_environment_path(key: str) -> Path:
+    return get_processed_data_path().joinpath(key, "environment.npy")
+
+
+def get_processed_environment_header_path(key: str) -> Path:
+    return get_processed_data_path().joinpath(key, "environment.json")
+
+
 def get_log_config_path() -> Path:
     return get_main_path().joinpath("src/log_config.conf")
 
@@ -37,5 +45,9 @@ def get_binary_world_map_zip_path():
     return get_world_map_dir_path().joinpath("full_world_map.zip")
 
 
+def get_topography_cache_dir_path() -> Path:
+    return get_main_path().joinpath("data/topography_cache")
+
+
 def get_checkpoint_dir_path():
     return get_main_path().joinpath("checkpoints")
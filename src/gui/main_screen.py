@@ -9,7 +9,7 @@ from PIL import Image, ImageTk
 
 import simulation.simulation as simulation
 from checkpoints import initialize_points_from_checkpoint
-from color import blend_color
+from color import blend_color, blend_colors
 from data.data_processor import DataProcessor, DataReader, DataValidationException
 from files import get_main_path
 from gui.utilities import get_tooltip_text, create_frame, create_label_pack, create_input_entry_pack, \
@@ -139,10 +139,7 @@ def start_simulation(window, points=None, oil_sources=None):
             if 0 <= x < self.image_array_width and 0 <= y < self.image_array_height:
                 coord = (x, y)
                 if engine.get_topography(coord) == simulation.TopographyState.SEA:
-                    if coord not in engine.world:
-                        engine.world[coord] = simulation.Point(coord, engine)
-
-                    point_clicked = engine.world[coord]
+                    point_clicked = engine.world.add(coord)
                     point_clicked.add_oil(self.image_change_controller.oil_to_add_on_click)
 
                     var = blend_color(InitialValues.OIL_COLOR, InitialValues.SEA_COLOR,
@@ -416,23 +413,25 @@ def start_simulation(window, points=None, oil_sources=None):
                 if not first_update:
                     self.viewer.update_tooltip_text()
 
-                for coords in engine.world:
-                    if self.viewer.top <= coords[1] < self.viewer.bottom and self.viewer.left < coords[0] <= self.viewer.right:
-                        point = engine.world[coords]
-                        if point.topography == simulation.TopographyState.LAND:
-                            var = blend_color(InitialValues.LAND_WITH_OIL_COLOR, InitialValues.LAND_COLOR,
-                                              point.oil_mass / self.minimal_oil_to_show)
-                        else:
-                            var = blend_color(InitialValues.OIL_COLOR, InitialValues.SEA_COLOR,
-                                              point.oil_mass / self.minimal_oil_to_show)
-                        self.full_img.putpixel((coords[0], coords[1]), var)
-
-                for coords in points_removed:
-                    if coords in engine.lands:
-                        var = InitialValues.LAND_COLOR
-                    else:
-                        var = InitialValues.SEA_COLOR
-                    self.full_img.putpixel((coords[0], coords[1]), var)
+                world = engine.world
+                slots = world.active_slots()
+                xs, ys = world.coords[slots, 0], world.coords[slots, 1]
+                visible = (self.viewer.top <= ys) & (ys < self.viewer.bottom) & \
+                          (self.viewer.left < xs) & (xs <= self.viewer.right)
+                slots, xs, ys = slots[visible], xs[visible], ys[visible]
+                ratios = world.oil_mass[slots] / self.minimal_oil_to_show
+                colors = np.where(world.is_land[slots, None],
+                                  blend_colors(InitialValues.LAND_WITH_OIL_COLOR, InitialValues.LAND_COLOR, ratios),
+                                  blend_colors(InitialValues.OIL_COLOR, InitialValues.SEA_COLOR, ratios))
+                pixels = self.full_img.load()
+                for x, y, color in zip(xs.tolist(), ys.tolist(), colors.tolist()):
+                    pixels[x, y] = tuple(color)
+
+                removed_xs = np.array([coords[0] for coords in points_removed], dtype=np.int64)
+                removed_ys = np.array([coords[1] for coords in points_removed], dtype=np.int64)
+                for x, y, is_land in zip(removed_xs.tolist(), removed_ys.tolist(),
+                                         engine.is_land_many(removed_xs, removed_ys).tolist()):
+                    pixels[x, y] = InitialValues.LAND_COLOR if is_land else InitialValues.SEA_COLOR
 
                 self.value_not_yet_processed = 0
 
@@ -487,29 +486,31 @@ def start_simulation(window, points=None, oil_sources=None):
         if InitialValues.data_preprocessor_initial_timestamp is not None:
             InitialValues.simulation_initial_parameters.time.min = deepcopy(InitialValues.data_preprocessor_initial_timestamp) 
 
-        result = sym_data_reader.preprocess(deepcopy(InitialValues.simulation_initial_parameters))
+        result = sym_data_reader.preprocess(deepcopy(InitialValues.simulation_initial_parameters),
+                                            InitialValues.preprocessing_processes, InitialValues.preprocessing_mode)
         InitialValues.simulation_initial_parameters.time.min = memorized_time_start
         return result
 
-    engine = simulation.SimulationEngine(get_data_processor())
+    engine = simulation.SimulationEngine(get_data_processor(), workers=InitialValues.simulation_workers)
+
+    def close_engine(event):
+        if event.widget is window:
+            engine.close()
+
+    window.bind("<Destroy>", close_engine, add="+")
 
     if points:
         initialize_points_from_checkpoint(points, engine)
     if oil_sources:
         engine.add_oil_sources(oil_sources)
 
-    x_indices = engine.x_indices
-    y_indices = engine.y_indices
-
     sea_color = np.array(InitialValues.SEA_COLOR, dtype=np.uint8)
     land_color = np.array(InitialValues.LAND_COLOR, dtype=np.uint8)
 
     image_array = np.full((InitialValues.point_side_lat_count, InitialValues.point_side_lon_count, 3), sea_color,
                           dtype=np.uint8)
 
-    image_array[y_indices, x_indices, :] = land_color
-
-    del engine.x_indices, engine.y_indices
+    image_array[engine.land_mask != 0] = land_color
 
     main_frame = create_frame(window, 0, 0, 1, 1, tk.N + tk.S + tk.E + tk.W, 5, 5)
 
@@ -1,9 +1,11 @@
+from os import cpu_count
+
 import pandas as pd
 
 from data.generic import Range
 from data.measurement_data import Coordinates
 from data.simulation_run_parameters import Interpolation_grid_size, SimulationRunParameters
-from simulation.utilities import Neighbourhood
+from simulation.utilities import Neighbourhood, PreprocessingMode, ProjectionMode
 from files import get_main_path
 
 
@@ -25,6 +27,8 @@ class InitialValues:
     point_side_lon_count: int = None
 
     top_left_coord: Coordinates = None
+    projection_mode: ProjectionMode = ProjectionMode.GEODESIC
+    projection_max_error = 0.1  # fraction of point_side_size allowed as error of the local projection
     top_left_binary_offset = None
 
     min_lon = None
@@ -76,3 +80,7 @@ class InitialValues:
     checkpoint_frequency: int = 0
     total_simulation_time: int = 0
     curr_iter: int = 0
+    simulation_workers: int = cpu_count() or 1  # threads running the array stages of a step
+    preprocessing_processes: int = 1  # processes interpolating the groups of environment variables
+    preprocessing_mode: PreprocessingMode = PreprocessingMode.EAGER
+    processed_data_max_size: int = 4 * 1024 ** 3  # [B] least recently used preprocessed data is removed above it
@@ -9,7 +9,8 @@ from data.simulation_run_parameters import Interpolation_grid_size, SimulationRu
 from initial_values import InitialValues
 from simulation.utilities import Neighbourhood
 from topology.binary_map_math import project_binary_map_coordinates
-from topology.math import MoveDirection, get_coordinate_from_xy, get_xy_dist_from_coord, move_coordinate
+from topology.math import MoveDirection, get_coordinate_from_xy, get_xy_dist_from_coord, move_coordinate, \
+    set_projection_mode
 
 logger = getLogger("initial_values")
 
@@ -97,6 +98,7 @@ def set_simulation_coordinates_parameters(top_coord: float,
     InitialValues.min_lat = min_lat
     
     InitialValues.top_left_binary_offset = project_binary_map_coordinates(InitialValues.top_left_coord)
+    set_projection_mode(InitialValues.projection_mode)
 
     InitialValues.simulation_time = (
             InitialValues.simulation_initial_parameters.time.max - InitialValues.simulation_initial_parameters.time.min).total_seconds()
@@ -0,0 +1,109 @@
+import numpy as np
+
+from initial_values import InitialValues
+from simulation import kernels
+from simulation.kernels import KernelBackend
+from simulation.parallel import IsLandFunction, SLOT_CHUNK_SIZE, split_tasks
+from simulation.utilities import Neighbourhood
+
+
+def _advection_vectors(world, slots: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    ALPHA = 1.1
+    BETA = 0.03
+
+    delta_r = (ALPHA * world.wave_velocity[slots] + BETA * world.wind_velocity[slots]) * InitialValues.iter_as_sec
+    delta_r /= InitialValues.point_side_size
+    return delta_r[:, 1], -delta_r[:, 0]
+
+
+def _advection_land_collision(xs: np.ndarray, ys: np.ndarray, advection_x: np.ndarray, advection_y: np.ndarray,
+                              is_land: IsLandFunction) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Marches from every cell along its advection vector and stops the oil at the first land cell on the way.
+    Vectors of the stopped cells are zeroed in place, so they are not going through land in the next step.
+    """
+    next_x = xs + advection_x.astype(np.int64)
+    next_y = ys + advection_y.astype(np.int64)
+    steps = np.maximum(np.abs(advection_x), np.abs(advection_y)).astype(np.int64)
+    marching = np.flatnonzero(steps > 1)
+    for i in range(1, steps.max(initial=0)):
+        marching = marching[steps[marching] > i]
+        if len(marching) == 0:
+            break
+        x, y = xs[marching], ys[marching]
+        vector_x, vector_y = advection_x[marching], advection_y[marching]
+        along_x = np.abs(vector_x) > np.abs(vector_y)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            crossing_x = np.where(along_x, x + i * np.sign(vector_x), np.rint(x + i * vector_x / np.abs(vector_y)))
+            crossing_y = np.where(along_x, y + np.rint(i * vector_y / np.abs(vector_x)), y + i * np.sign(vector_y))
+        crossing_x, crossing_y = crossing_x.astype(np.int64), crossing_y.astype(np.int64)
+
+        collided = is_land(crossing_x, crossing_y)
+        stopped = marching[collided]
+        next_x[stopped] = crossing_x[collided]
+        next_y[stopped] = crossing_y[collided]
+        advection_x[stopped] = 0
+        advection_y[stopped] = 0
+        marching = marching[~collided]
+    return next_x, next_y
+
+
+def process_advection(world, slots: np.ndarray, executor, backend: KernelBackend = KernelBackend.NUMPY) -> None:
+    """
+    Moves oil of the given sea cells of a WorldState along the current and wind.
+
+    The displacement and the bilinear split over up to four target cells are computed for chunks of cells as tasks
+    of the executor, and the moved mass, together with the mass-weighted viscosity and emulsification, is
+    scatter-added into the targets. Oil moved out of the simulation area is lost.
+    """
+    if len(slots) == 0:
+        return
+    task = kernels.advection_transfers if backend == KernelBackend.NUMBA else _advection_transfers
+    transfers = executor.map(task, world, [(chunk,) for chunk in split_tasks(slots, SLOT_CHUNK_SIZE)])
+    target_x, target_y, moved, viscosity, emulsification = map(np.concatenate, zip(*transfers))
+    targets = world.slots_of(target_x, target_y, create=True)
+    inside = targets >= 0
+    world.scatter_add_oil(targets[inside], moved[inside], viscosity[inside], emulsification[inside])
+
+
+def _advection_transfers(world, slots: np.ndarray) -> tuple[np.ndarray, ...]:
+    """Takes the moving oil out of the given cells. Returns targets, masses, viscosities and emulsification rates."""
+    xs, ys = world.coords[slots, 0], world.coords[slots, 1]
+    advection_x, advection_y = _advection_vectors(world, slots)
+    next_x, next_y = _advection_land_collision(xs, ys, advection_x, advection_y, world.is_land_many)
+
+    fractional_part_x = np.fmod(np.abs(advection_x), 1) * np.sign(advection_x)
+    fractional_part_y = np.fmod(np.abs(advection_y), 1) * np.sign(advection_y)
+    x_shift = np.sign(fractional_part_x).astype(np.int64)
+    y_shift = np.sign(fractional_part_y).astype(np.int64)
+    target_x = [next_x, next_x + x_shift, next_x + x_shift]
+    target_y = [next_y + y_shift, next_y, next_y + y_shift]
+    areas = [np.abs(fractional_part_y) * (1 - np.abs(fractional_part_x)),
+             np.abs(fractional_part_x) * (1 - np.abs(fractional_part_y)),
+             np.abs(fractional_part_x * fractional_part_y)]
+    if InitialValues.neighbourhood == Neighbourhood.VON_NEUMANN:
+        target_x.pop()
+        target_y.pop()
+        area_to_split = areas.pop()
+        areas_sum = areas[0] + areas[1]
+        split = np.divide(area_to_split, areas_sum, out=np.zeros_like(areas_sum), where=areas_sum > 0)
+        areas = [areas[0] * (1 + split), areas[1] * (1 + split)]
+
+    oil_mass = world.oil_mass[slots]
+    moved = [oil_mass * area for area in areas]
+    remaining = oil_mass - sum(moved)
+    is_moved = (next_x != xs) | (next_y != ys)
+    target_x.append(next_x)
+    target_y.append(next_y)
+    moved.append(np.where(is_moved, remaining, 0))
+
+    sources = np.tile(np.arange(len(slots)), len(moved))
+    target_x = np.concatenate(target_x)
+    target_y = np.concatenate(target_y)
+    moved = np.concatenate(moved)
+    transfer = moved > 0
+    sources, target_x, target_y, moved = sources[transfer], target_x[transfer], target_y[transfer], moved[transfer]
+
+    world.oil_mass[slots] = oil_mass - np.bincount(sources, weights=moved, minlength=len(slots))
+    return (target_x, target_y, moved, world.viscosity_dynamic[slots][sources],
+            world.emulsification_rate[slots][sources])
@@ -0,0 +1,203 @@
+"""
+Compiled per-cell loops of a step, used with the Numba backend. Every loop applies the Point formulas cell by cell
+over the state arrays of a WorldState. Without Numba the engine runs the NumPy stages instead.
+"""
+from enum import Enum
+from math import exp, fmod, hypot, log, sqrt
+
+import numpy as np
+
+from initial_values import InitialValues
+from simulation.utilities import Neighbourhood
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+
+class KernelBackend(Enum):
+    NUMPY = "numpy"
+    NUMBA = "numba"
+
+
+def is_numba_available() -> bool:
+    return njit is not None
+
+
+def _weathering_loop(slots, wind_velocity, temperature, oil_mass, viscosity_dynamic, emulsification_rate,
+                     evaporation_rate, iter_as_sec, point_side_size, emulsion_max_content_water, boiling_point,
+                     molar_mass, interfacial_tension, oil_density, c, initial_viscosity):
+    K_EMULSIFICATION = 5.0e-7
+    K_EVAPORATION = 1.25e-3
+    R = 8.314  # [J/(mol*K)]
+
+    evaporated = 0.0
+    dispersed = 0.0
+    for slot in slots:
+        wind_speed = hypot(wind_velocity[slot, 0], wind_velocity[slot, 1])
+        mass = oil_mass[slot]
+        viscosity = viscosity_dynamic[slot]
+
+        old_emulsification_rate = emulsification_rate[slot]
+        emulsification = old_emulsification_rate + iter_as_sec * K_EMULSIFICATION * (
+                ((wind_speed + 1) ** 2) * (1 - old_emulsification_rate / emulsion_max_content_water))
+        emulsification = min(emulsification, emulsion_max_content_water)
+        delta_y = emulsification - old_emulsification_rate
+
+        T = temperature[slot]
+        P = 1000 * exp(-(4.4 + log(boiling_point)) * (
+                1.803 * (boiling_point / T - 1) - 0.803 * log(boiling_point / T)))  # [Pa]
+        evaporation = (K_EVAPORATION * (molar_mass / 1000) * P) / (R * T)
+        evaporated_mass = min(iter_as_sec * point_side_size * point_side_size * evaporation, mass)
+        delta_f = evaporated_mass / mass if mass > 0 else 0.0
+        mass -= evaporated_mass
+
+        Da = 0.11 * (wind_speed + 1) ** 2
+        evaporated_interfacial_tension = interfacial_tension * (1 + evaporation)
+        slick_thickness = (mass / oil_density) / (point_side_size ** 2) * 100  # [cm]
+        Db = 1 / (1 + 50 * sqrt(viscosity * 100) * slick_thickness * evaporated_interfacial_tension)
+        dispersed_mass = mass * Da * Db / (3600 * iter_as_sec)
+        mass -= dispersed_mass
+
+        viscosity += c * viscosity * delta_f + (2.5 * viscosity * delta_y) / (
+                (1 - emulsion_max_content_water * emulsification) ** 2)
+        if mass < 1:
+            viscosity = initial_viscosity
+
+        oil_mass[slot] = mass
+        viscosity_dynamic[slot] = viscosity
+        emulsification_rate[slot] = emulsification
+        evaporation_rate[slot] = evaporation
+        evaporated += evaporated_mass
+        dispersed += dispersed_mass
+    return evaporated, dispersed
+
+
+def _is_land(land_mask, x, y):
+    return 0 <= y < land_mask.shape[0] and 0 <= x < land_mask.shape[1] and land_mask[y, x] != 0
+
+
+def _sign(value):
+    return 1 if value > 0 else -1 if value < 0 else 0
+
+
+def _advection_loop(slots, coords, wave_velocity, wind_velocity, oil_mass, viscosity_dynamic, emulsification_rate,
+                    land_mask, iter_as_sec, point_side_size, von_neumann):
+    ALPHA = 1.1
+    BETA = 0.03
+
+    n = len(slots)
+    target_x = np.empty(4 * n, dtype=np.int64)
+    target_y = np.empty(4 * n, dtype=np.int64)
+    moved = np.empty(4 * n)
+    viscosity = np.empty(4 * n)
+    emulsification = np.empty(4 * n)
+    count = 0  # transfers so far
+    for slot in slots:
+        x, y = coords[slot, 0], coords[slot, 1]
+        advection_x = (ALPHA * wave_velocity[slot, 1] + BETA * wind_velocity[slot, 1]) * iter_as_sec / point_side_size
+        advection_y = -(ALPHA * wave_velocity[slot, 0] + BETA * wind_velocity[slot, 0]) * iter_as_sec / point_side_size
+
+        # check if there is a land between current and next cell
+        next_x = x + int(advection_x)
+        next_y = y + int(advection_y)
+        for i in range(1, int(max(abs(advection_x), abs(advection_y)))):
+            if abs(advection_x) > abs(advection_y):
+                crossing_x = x + i * _sign(advection_x)
+                crossing_y = y + int(np.rint(i * advection_y / abs(advection_x)))
+            else:
+                crossing_x = int(np.rint(x + i * advection_x / abs(advection_y)))
+                crossing_y = y + i * _sign(advection_y)
+            if _is_land(land_mask, crossing_x, crossing_y):
+                next_x, next_y = crossing_x, crossing_y
+                advection_x, advection_y = 0.0, 0.0  # so it's not going through land in the next step
+                break
+
+        fractional_part_x = fmod(abs(advection_x), 1) * _sign(advection_x)
+        fractional_part_y = fmod(abs(advection_y), 1) * _sign(advection_y)
+        x_shift = _sign(fractional_part_x)
+        y_shift = _sign(fractional_part_y)
+        area_y = abs(fractional_part_y) * (1 - abs(fractional_part_x))
+        area_x = abs(fractional_part_x) * (1 - abs(fractional_part_y))
+        area_xy = abs(fractional_part_x * fractional_part_y)
+        if von_neumann:
+            areas_sum = area_y + area_x
+            split = area_xy / areas_sum if areas_sum > 0 else 0.0
+            area_y, area_x, area_xy = area_y * (1 + split), area_x * (1 + split), 0.0
+
+        mass = oil_mass[slot]
+        first = count
+        for dx, dy, area in ((0, y_shift, area_y), (x_shift, 0, area_x), (x_shift, y_shift, area_xy)):
+            if mass * area > 0:
+                target_x[count], target_y[count], moved[count] = next_x + dx, next_y + dy, mass * area
+                count += 1
+        remaining = mass - mass * area_y - mass * area_x - mass * area_xy
+        if (next_x != x or next_y != y) and remaining > 0:
+            target_x[count], target_y[count], moved[count] = next_x, next_y, remaining
+            count += 1
+        for transfer in range(first, count):
+            oil_mass[slot] -= moved[transfer]
+            viscosity[transfer] = viscosity_dynamic[slot]
+            emulsification[transfer] = emulsification_rate[slot]
+    return target_x[:count], target_y[:count], moved[:count], viscosity[:count], emulsification[:count]
+
+
+def _seashore_loop(slots, coords, oil_mass, land_mask, iter_as_sec, lon_count, lat_count, moore):
+    HALF_TIME = 3600 * 24  # 24h for sand beach / sand and gravel beach
+    OFFSETS = ((1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (1, -1), (-1, 1), (-1, -1))
+
+    neighbours = 8 if moore else 4
+    target_x = np.empty(neighbours * len(slots), dtype=np.int64)
+    target_y = np.empty(neighbours * len(slots), dtype=np.int64)
+    shared = np.empty(neighbours * len(slots))
+    count = 0
+    for slot in slots:
+        x, y = coords[slot, 0], coords[slot, 1]
+        delta_mass = log(2) * oil_mass[slot] * iter_as_sec / HALF_TIME
+        oil_mass[slot] -= delta_mass
+        first = count
+        for i in range(neighbours):
+            neighbour_x, neighbour_y = x + OFFSETS[i][0], y + OFFSETS[i][1]
+            if not (0 <= neighbour_x < lon_count and 0 <= neighbour_y < lat_count):
+                continue
+            if land_mask[neighbour_y, neighbour_x] != 0:
+                continue
+            target_x[count], target_y[count] = neighbour_x, neighbour_y
+            count += 1
+        for i in range(first, count):
+            shared[i] = delta_mass / (count - first)
+    return target_x[:count], target_y[:count], shared[:count]
+
+
+if njit is not None:
+    _sign = njit(cache=True)(_sign)
+    _is_land = njit(cache=True)(_is_land)
+    _weathering_loop = njit(cache=True, nogil=True)(_weathering_loop)
+    _advection_loop = njit(cache=True, nogil=True)(_advection_loop)
+    _seashore_loop = njit(cache=True, nogil=True)(_seashore_loop)
+
+
+def process_weathering(world, slots: np.ndarray) -> tuple[float, float]:
+    """Compiled counterpart of weathering.process_weathering."""
+    return _weathering_loop(slots, world.wind_velocity, world.temperature, world.oil_mass, world.viscosity_dynamic,
+                            world.emulsification_rate, world.evaporation_rate, float(InitialValues.iter_as_sec),
+                            float(InitialValues.point_side_size), InitialValues.emulsion_max_content_water,
+                            float(InitialValues.boiling_point), InitialValues.molar_mass,
+                            float(InitialValues.interfacial_tension), float(InitialValues.oil_density),
+                            float(InitialValues.c), InitialValues.viscosity_dynamic)
+
+
+def advection_transfers(world, slots: np.ndarray) -> tuple[np.ndarray, ...]:
+    """Compiled counterpart of advection._advection_transfers."""
+    return _advection_loop(slots, world.coords, world.wave_velocity, world.wind_velocity, world.oil_mass,
+                           world.viscosity_dynamic, world.emulsification_rate, world.land_mask,
+                           float(InitialValues.iter_as_sec), float(InitialValues.point_side_size),
+                           InitialValues.neighbourhood == Neighbourhood.VON_NEUMANN)
+
+
+def seashore_transfers(world, slots: np.ndarray) -> tuple[np.ndarray, ...]:
+    """Compiled counterpart of seashore._seashore_transfers."""
+    return _seashore_loop(slots, world.coords, world.oil_mass, world.land_mask, float(InitialValues.iter_as_sec),
+                          InitialValues.point_side_lon_count, InitialValues.point_side_lat_count,
+                          InitialValues.neighbourhood == Neighbourhood.MOORE)
@@ -0,0 +1,190 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from logging import getLogger
+from math import prod
+from multiprocessing import shared_memory
+from typing import Any, Callable, Optional
+
+import numpy as np
+
+from initial_values import InitialValues
+
+logger = getLogger("simulation")
+
+SLOT_CHUNK_SIZE = 1 << 16  # cells in one task of the per-cell stages
+
+ArrayDescriptor = tuple[str, tuple[int, ...], str]  # shared memory name, shape, dtype
+IsLandFunction = Callable[[np.ndarray, np.ndarray], np.ndarray]
+'''
+Step task: a module level function called as function(world, *task). It may write the state and the scratch arrays
+of the slots it owns, contributions to other cells go back in its result.
+
+Weathering, advection and the two spreading passes run as tasks. Creating cells, reducing contributions, the weather
+refresh, the seashore interaction and removing empty cells run in the main process, about a third of a step, which
+bounds the speedup of a step to about 2.5x at any number of workers. `python benchmark.py step` measures it.
+'''
+TaskFunction = Callable[..., Any]
+
+
+class SharedMemoryAllocator:
+    """Creates NumPy arrays in shared memory blocks, so worker processes can attach to them by name."""
+
+    def __init__(self):
+        self._blocks: dict[int, tuple[shared_memory.SharedMemory, np.ndarray]] = dict()  # id of the array -> block
+        self._retired: list[shared_memory.SharedMemory] = []
+
+    def zeros(self, shape: tuple[int, ...], dtype) -> np.ndarray:
+        dtype = np.dtype(dtype)
+        block = shared_memory.SharedMemory(create=True, size=max(1, prod(shape) * dtype.itemsize))
+        array = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        array.fill(0)
+        self._blocks[id(array)] = block, array
+        return array
+
+    def descriptor(self, array: np.ndarray) -> ArrayDescriptor:
+        return self._blocks[id(array)][0].name, array.shape, array.dtype.str
+
+    def release(self, array: np.ndarray) -> None:
+        block, _ = self._blocks.pop(id(array))
+        block.unlink()
+        self._retired.append(block)
+        self._close_retired()
+
+    def _close_retired(self) -> None:
+        still_used = []
+        for block in self._retired:
+            try:
+                block.close()
+            except BufferError:  # some array still points into the block
+                still_used.append(block)
+        self._retired = still_used
+
+    def close(self) -> None:
+        for block, _ in self._blocks.values():
+            block.unlink()
+            self._retired.append(block)
+        self._blocks.clear()
+        self._close_retired()
+
+
+class SerialExecutor:
+    @property
+    def workers(self) -> int:
+        return 1
+
+    def map(self, function: TaskFunction, world, tasks: list[tuple]) -> list[Any]:
+        return [function(world, *task) for task in tasks]
+
+    def close(self) -> None:
+        pass
+
+
+class ThreadExecutor:
+    """
+    Runs step tasks on a thread pool. NumPy releases the GIL in the array kernels, so the tasks run in parallel on
+    the shared state without copying it. Tasks write only the cells they own, contributions to other cells are
+    reduced in chunk order by the caller, so results do not depend on the thread scheduling.
+    """
+
+    def __init__(self, workers: int):
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix="simulation")
+        self._workers = workers
+
+    @property
+    def workers(self) -> int:
+        return self._workers
+
+    def map(self, function: TaskFunction, world, tasks: list[tuple]) -> list[Any]:
+        if len(tasks) == 1:
+            return [function(world, *tasks[0])]
+        return list(self._pool.map(lambda task: function(world, *task), tasks))
+
+    def close(self) -> None:
+        self._pool.shutdown()
+
+
+class ProcessExecutor:
+    """
+    Runs step tasks in worker processes. The world state lives in shared memory, so tasks only carry slot and tile
+    ids, and workers send back the contributions to cells they do not own.
+    """
+
+    def __init__(self, processes: int, land_mask: ArrayDescriptor):
+        initial_values = {name: value for name, value in vars(InitialValues).items() if not name.startswith("__")}
+        self._pool = ProcessPoolExecutor(processes, initializer=_init_worker, initargs=(initial_values, land_mask))
+        self._processes = processes
+        logger.debug(f"Started {processes} simulation worker processes")
+
+    @property
+    def workers(self) -> int:
+        return self._processes
+
+    def map(self, function: TaskFunction, world, tasks: list[tuple]) -> list[Any]:
+        descriptor = world.shared_descriptor()
+        futures = [self._pool.submit(_run_task, function, descriptor, task) for task in tasks]
+        return [future.result() for future in futures]
+
+    def close(self) -> None:
+        self._pool.shutdown()
+
+
+def split_tasks(ids: np.ndarray, chunk_size: int) -> list[np.ndarray]:
+    """
+    Splits ids into consecutive chunks of a fixed size. Chunks do not depend on the number of workers, and results
+    are reduced in chunk order, so a run gives the same numbers with any executor.
+    """
+    return [ids[i:i + chunk_size] for i in range(0, len(ids), chunk_size)]
+
+
+_worker_land_mask: Optional[np.ndarray] = None
+_worker_blocks: dict[str, shared_memory.SharedMemory] = dict()
+_worker_land_mask_block: Optional[shared_memory.SharedMemory] = None
+
+
+def _init_worker(initial_values: dict[str, Any], land_mask: ArrayDescriptor) -> None:
+    global _worker_land_mask, _worker_land_mask_block
+    for name, value in initial_values.items():
+        setattr(InitialValues, name, value)
+    _worker_land_mask_block = _open_block(land_mask[0])
+    _worker_land_mask = np.ndarray(land_mask[1], dtype=np.dtype(land_mask[2]), buffer=_worker_land_mask_block.buf)
+
+
+def _worker_is_land_many(xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+    from topology.lands_loader import is_land_at
+
+    return is_land_at(_worker_land_mask, xs, ys)
+
+
+def _open_block(name: str) -> shared_memory.SharedMemory:
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # before python 3.13 attaching registers the block again in the tracker shared with the
+        # main process, which is harmless, the main process unlinks it
+        return shared_memory.SharedMemory(name=name)
+
+
+def _attach(descriptor: ArrayDescriptor) -> np.ndarray:
+    name, shape, dtype = descriptor
+    if name not in _worker_blocks:
+        _worker_blocks[name] = _open_block(name)
+    return np.ndarray(shape, dtype=np.dtype(dtype), buffer=_worker_blocks[name].buf)
+
+
+def _detach_unused(used: set[str]) -> None:
+    for name in [name for name in _worker_blocks if name not in used]:
+        try:
+            _worker_blocks[name].close()
+            del _worker_blocks[name]
+        except BufferError:  # still viewed by the state of the previous task, closed with the next one
+            pass
+
+
+def _run_task(function: TaskFunction, descriptor: tuple[dict[str, ArrayDescriptor], dict[str, ArrayDescriptor]],
+              task: tuple) -> Any:
+    from simulation.world_state import WorldState
+
+    fields, scratch = descriptor
+    _detach_unused({name for name, _, _ in list(fields.values()) + list(scratch.values())})
+    world = WorldState.from_arrays({name: _attach(array) for name, array in fields.items()},
+                                   {name: _attach(array) for name, array in scratch.items()}, _worker_is_land_many,
+                                   _worker_land_mask)
+    return function(world, *task)
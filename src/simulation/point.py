@@ -1,7 +1,6 @@
 from enum import Enum
 
 import numpy as np
-import pandas as pd
 from numpy import exp, log, sqrt
 
 from initial_values import InitialValues
@@ -55,21 +54,20 @@ class Point:
                 self._oil_mass + mass))
         self._oil_mass += mass
 
-    def _should_update_weather_data(self, time_delta: pd.Timedelta) -> bool:
+    def _should_update_weather_data(self, time: int) -> bool:
         return (self._last_weather_update_time is None
-                or self._data_processor.should_update_data(time_delta - self._last_weather_update_time))
+                or self._data_processor.should_update_data(time - self._last_weather_update_time))
 
     def _update_weather_data(self) -> None:
-        time_delta = pd.Timedelta(seconds=int(self._engine.total_time))
-        if not self._should_update_weather_data(time_delta):
+        time = self._engine.data_time
+        if not self._should_update_weather_data(time):
             return
-        time_stamp = InitialValues.simulation_initial_parameters.time.min + time_delta
         measurement = self._data_processor.get_measurement(get_coordinate_from_xy_cached(self.coord), self.weather_station_coordinates,
-                                                           time_stamp)
+                                                           time)
         self._wave_velocity = measurement.current.to_numpy()
         self._wind_velocity = measurement.wind.to_numpy()
         self._temperature = measurement.temperature
-        self._last_weather_update_time = time_delta
+        self._last_weather_update_time = time
 
     def update(self) -> tuple[float, float]:
         self._update_weather_data()
@@ -168,9 +166,10 @@ class Point:
         if InitialValues.neighbourhood == Neighbourhood.VON_NEUMANN:
             neighbours.pop()
             area_to_split = areas.pop()
-            if sum(areas) > 0:
-                areas[0] += area_to_split * areas[0] / sum(areas)
-                areas[1] += area_to_split * areas[1] / sum(areas)
+            areas_sum = sum(areas)
+            if areas_sum > 0:
+                areas[0] += area_to_split * areas[0] / areas_sum
+                areas[1] += area_to_split * areas[1] / areas_sum
         oil_mass = self._oil_mass
         for neighbour, area in zip(neighbours, areas):
             self.move_oil_to_other(neighbour, oil_mass * area)
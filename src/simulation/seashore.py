@@ -0,0 +1,40 @@
+from math import log
+
+import numpy as np
+
+from initial_values import InitialValues
+from simulation import kernels
+from simulation.kernels import KernelBackend
+from simulation.utilities import get_neighbour_coordinates
+
+
+def process_seashore_interaction(world, slots: np.ndarray, backend: KernelBackend = KernelBackend.NUMPY) -> None:
+    """
+    Moves a part of the oil of the given land cells to their sea neighbours, like Point._process_seashore_interaction.
+    Neighbours get only the mass, their viscosity and emulsification rate are kept.
+    """
+    if len(slots) == 0:
+        return
+    transfers = kernels.seashore_transfers if backend == KernelBackend.NUMBA else _seashore_transfers
+    target_x, target_y, shared = transfers(world, slots)
+    touched, index = np.unique(world.slots_of(target_x, target_y, create=True), return_inverse=True)
+    world.oil_mass[touched] += np.bincount(index, weights=shared)
+
+
+def _seashore_transfers(world, slots: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Takes the shared oil out of the given cells. Returns targets and their masses."""
+    HALF_TIME = 3600 * 24  # 24h for sand beach / sand and gravel beach
+
+    delta_mass = log(2) * world.oil_mass[slots] * InitialValues.iter_as_sec / HALF_TIME
+    world.oil_mass[slots] -= delta_mass
+
+    offsets = np.array(get_neighbour_coordinates(0, 0, InitialValues.neighbourhood))
+    xs, ys = world.coords[slots, 0], world.coords[slots, 1]
+    target_x = xs[:, None] + offsets[:, 0]
+    target_y = ys[:, None] + offsets[:, 1]
+    is_sea = (0 <= target_x) & (target_x < InitialValues.point_side_lon_count) & \
+             (0 <= target_y) & (target_y < InitialValues.point_side_lat_count)
+    is_sea[is_sea] = ~world.is_land_many(target_x[is_sea], target_y[is_sea])
+    sea_neighbours = is_sea.sum(axis=1)
+    shared = np.divide(delta_mass, sea_neighbours, out=np.zeros_like(delta_mass), where=sea_neighbours > 0)
+    return target_x[is_sea], target_y[is_sea], np.broadcast_to(shared[:, None], is_sea.shape)[is_sea]
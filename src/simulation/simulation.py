@@ -1,31 +1,70 @@
+from logging import getLogger
 from typing import Any
 
+import numpy as np
 import pandas as pd
 from PIL.Image import Image
 
 from checkpoints import save_to_json
 from data.data_processor import DataProcessor
 from initial_values import InitialValues
+from simulation import kernels
+from simulation.advection import process_advection
+from simulation.kernels import KernelBackend
+from simulation.parallel import ProcessExecutor, SerialExecutor, SharedMemoryAllocator, SLOT_CHUNK_SIZE, \
+    ThreadExecutor, split_tasks
 from simulation.point import Point, Coord_t, TopographyState
+from simulation.seashore import process_seashore_interaction
 from simulation.spreading import SpreadingEngine
-from topology.lands_loader import load_topography
+from simulation.stations import WeatherStationGrid
+from simulation.weathering import process_weathering
+from simulation.world_state import WorldState
+from topology.lands_loader import is_land_at, load_topography
 from topology.math import get_xy_from_coord_raw
 
+logger = getLogger("simulation")
+
 
 class SimulationEngine:
-    def __init__(self, data_processor: DataProcessor):
-        self._world: dict[Coord_t, Point] = dict()
+    def __init__(self, data_processor: DataProcessor, processes: int = 1, workers: int = 1,
+                 backend: KernelBackend | str = KernelBackend.NUMPY):
+        if processes > 1 and workers > 1:
+            raise ValueError("Simulation runs either on worker processes or on worker threads")
+        self._backend = KernelBackend(backend)
+        if self._backend == KernelBackend.NUMBA and not kernels.is_numba_available():
+            logger.warning("Numba is not installed, running the NumPy kernels")
+            self._backend = KernelBackend.NUMPY
+        self._allocator = SharedMemoryAllocator() if processes > 1 else None
+        self.land_mask = load_topography()
+        if self._allocator is not None:
+            shared_land_mask = self._allocator.zeros(self.land_mask.shape, self.land_mask.dtype)
+            shared_land_mask[:] = self.land_mask
+            self.land_mask = shared_land_mask
+        self.data_processor = data_processor
+        self.station_grid = WeatherStationGrid(data_processor)
+        self._world = WorldState(self, allocator=self._allocator)
         self.spreading_engine = SpreadingEngine(self)
 
         Point.world = self._world
-        self.data_processor = data_processor
         self.checkpoint_frequency = InitialValues.checkpoint_frequency
         self.timestep = InitialValues.iter_as_sec
+        self._data_time_step = data_processor.data_time_step
+        # [s] from the simulation start to the start of the data, positive when resumed from a checkpoint
+        self._data_time_offset = int((data_processor.time_start -
+                                      InitialValues.simulation_initial_parameters.time.min).total_seconds())
+        self._station_measurements = None
+        self._station_measurements_time = None  # [s] since the data start, when their data time step started
         self._total_mass = 0
         self._total_land_mass = 0
-        self.lands, self.x_indices, self.y_indices = load_topography()
+        if processes > 1:
+            self.executor = ProcessExecutor(processes, self._allocator.descriptor(self.land_mask))
+        elif workers > 1:
+            self.executor = ThreadExecutor(workers)
+        else:
+            self.executor = SerialExecutor()
         self._total_time = InitialValues.total_simulation_time
         self._constant_sources = []  # contains tuples (coord, mass_per_minute, spill_start, spill_end)
+        self._source_times = []  # (spill_start, spill_end) of the constant sources [s] since simulation start
         self._evaporated_oil = 0  # [kg]
         self._dispersed_oil = 0  # [kg]
         self._simulation_image = None
@@ -36,31 +75,55 @@ class SimulationEngine:
     def update(self) -> list[Coord_t]:
         self._pour_from_sources()
         self._update_oil_points()
-
-        self._total_mass = 0
-        self._total_land_mass = 0
-        for point in self._world.values():
-            point.pour_from_buffer()
-            self._total_mass += point.oil_mass
-            if point.topography == TopographyState.LAND:
-                self._total_land_mass += point.oil_mass
+        self._update_total_mass()
 
         self.spreading_engine.spread_oil_points(self._total_mass)
-        empty_points = [coord for coord, point in self._world.items() if not point.contain_oil()]
-        deleted = []
-        for point in empty_points:
-            del self._world[point]
-            deleted.append(point)
+        deleted = self._remove_empty_points()
+        self._world.release_empty_tiles()
         self._total_time += self.timestep
         self.save_checkpoint()
         return deleted
 
+    def _update_total_mass(self):
+        slots = self._world.active_slots()
+        oil_mass = self._world.oil_mass[slots]
+        self._total_mass = oil_mass.sum()
+        self._total_land_mass = oil_mass[self._world.is_land[slots]].sum()
+
     def _update_oil_points(self):
-        for coord in list(self._world.keys()):  # copy because dict changes size during iteration
-            evaporated, dispersed = self._world[coord].update()
+        slots = self._world.active_slots()  # copy because cells are added during the update
+        self._update_weather_data(slots)
+
+        is_land = self._world.is_land[slots]
+        process_seashore_interaction(self._world, slots[is_land], self._backend)
+
+        sea_slots = slots[~is_land]
+        weathering = kernels.process_weathering if self._backend == KernelBackend.NUMBA else process_weathering
+        tasks = [(chunk,) for chunk in split_tasks(sea_slots, SLOT_CHUNK_SIZE)]
+        for evaporated, dispersed in self.executor.map(weathering, self._world, tasks):
             self._evaporated_oil += evaporated
             self._dispersed_oil += dispersed
 
+        process_advection(self._world, sea_slots, self.executor, self._backend)
+
+    def _update_weather_data(self, slots: np.ndarray):
+        """
+        Refreshes weather of all cells once per data time step from measurements of their weather stations, in between
+        only cells created since the last refresh get it.
+        """
+        data_time = self.data_time // self._data_time_step * self._data_time_step
+        if data_time != self._station_measurements_time:
+            self._station_measurements = self.data_processor.get_station_measurements(self.data_time)
+            self._station_measurements_time = data_time
+        else:
+            slots = slots[np.isnan(self._world.last_weather_update[slots])]
+        self._world.set_weather(slots, self._station_measurements, self.data_time)
+
+    def _remove_empty_points(self) -> list[Coord_t]:
+        slots = self._world.active_slots()
+        slick_thickness = self._world.oil_mass[slots] / InitialValues.oil_density / InitialValues.point_side_size ** 2
+        return self._world.remove(slots[slick_thickness <= InitialValues.min_oil_thickness])
+
     def add_oil_sources(self, oil_sources: list[dict[str, Any]]):
         for oil_source in oil_sources:
             self._add_oil_source(get_xy_from_coord_raw(oil_source["coord"][1], oil_source["coord"][0]),
@@ -71,23 +134,37 @@ class SimulationEngine:
     def _add_oil_source(self, coord: Coord_t, mass_per_minute: float, spill_start: pd.Timestamp,
                         spill_end: pd.Timestamp):
         self._constant_sources.append((coord, mass_per_minute, spill_start, spill_end))
+        simulation_start = InitialValues.simulation_initial_parameters.time.min
+        self._source_times.append(((spill_start - simulation_start).total_seconds(),
+                                   (spill_end - simulation_start).total_seconds()))
 
     def _pour_from_sources(self):
-        current_timestamp = InitialValues.simulation_initial_parameters.time.min + pd.Timedelta(
-            seconds=self._total_time)
-        for spill in self._constant_sources:
-            cords, mass_per_minute, spill_start, spill_end = spill
-            if spill_start <= current_timestamp <= spill_end:
+        for (cords, mass_per_minute, _, _), (spill_start, spill_end) in zip(self._constant_sources,
+                                                                             self._source_times):
+            if spill_start <= self._total_time <= spill_end:
                 if cords not in self._world and 0 <= cords[0] < InitialValues.point_side_lon_count and 0 <= cords[
                     1] < InitialValues.point_side_lat_count:
-                    self._world[cords] = Point(cords, self)
+                    self._world.add(cords)
                 self._world[cords].add_oil(mass_per_minute * self.timestep / 60)
 
     def get_topography(self, coord: Coord_t) -> TopographyState:
-        if coord in self.lands:
+        x, y = coord
+        if 0 <= x < InitialValues.point_side_lon_count and 0 <= y < InitialValues.point_side_lat_count and \
+                self.land_mask[y, x]:
             return TopographyState.LAND
         return TopographyState.SEA
 
+    def is_land_many(self, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        return is_land_at(self.land_mask, np.asarray(xs), np.asarray(ys))
+
+    def close(self):
+        """Stops the workers and the data loading, and frees the shared memory of the world and the land mask."""
+        self.executor.close()
+        self.data_processor.close()
+        self._world.release()
+        if self._allocator is not None:
+            self._allocator.close()
+
     def get_oil_amounts(self):
         return self._total_mass - self._total_land_mass, self._total_land_mass
 
@@ -102,8 +179,11 @@ class SimulationEngine:
 
     @world.setter
     def world(self, world: dict[Coord_t, Point]):
-        self._world = world
-        Point.world = world
+        self._world.release()
+        self._world = WorldState(self, allocator=self._allocator)
+        for coord, point in world.items():
+            self._world[coord] = point
+        Point.world = self._world
 
     @property
     def simulation_image(self):
@@ -117,6 +197,11 @@ class SimulationEngine:
     def total_time(self):
         return self._total_time
 
+    @property
+    def data_time(self) -> int:
+        """[s] since the start of the data of the data processor"""
+        return int(self._total_time) - self._data_time_offset
+
     @property
     def evaporated_oil(self):
         return self._evaporated_oil
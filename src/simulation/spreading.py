@@ -1,16 +1,44 @@
+from enum import Enum
 from math import exp, sqrt
 from random import shuffle
 
+import numpy as np
+
 from initial_values import InitialValues
+from simulation.parallel import split_tasks
 from simulation.point import Point, Coord_t, TopographyState, is_coord_in_simulation_area
-from simulation.utilities import get_neighbour_coordinates
+from simulation.utilities import get_neighbour_coordinates, Neighbourhood
+from simulation.world_state import WorldState
+
+
+class SpreadingMode(Enum):
+    PAIRWISE = 0  # per-Point reference implementation
+    STENCIL = 1
+
+
+# half of the neighbourhood offsets, so that every edge is visited exactly once
+EDGE_DIRECTIONS = {
+    Neighbourhood.VON_NEUMANN: [(1, 0), (0, 1)],
+    Neighbourhood.MOORE: [(1, 0), (0, 1), (1, 1), (1, -1)]
+}
+
+STENCIL_CHUNK_TILES = 16
+_OUTFLOW_FIELDS = ("outflow", "kept_log")
+_EXCHANGE_FIELDS = ("scaled_outflow", "inflow", "inflow_viscosity", "inflow_emulsification")
 
 
 class SpreadingEngine:
-    def __init__(self, engine):
+    def __init__(self, engine, mode: SpreadingMode = SpreadingMode.STENCIL):
         self._engine = engine
+        self._mode = mode
 
     def spread_oil_points(self, total_mass: float):
+        if self._mode == SpreadingMode.STENCIL:
+            self._spread_stencil(total_mass)
+        else:
+            self._spread_pairwise(total_mass)
+
+    def _spread_pairwise(self, total_mass: float):
         new_points = {}
         for coord, point in self._engine.world.items():
             x, y = coord
@@ -27,6 +55,75 @@ class SpreadingEngine:
         for point in self._engine.world.values():
             point.pour_from_buffer()
 
+    def _spread_stencil(self, total_mass: float):
+        """
+        Spreads oil over every sea-sea edge as array operations on tiles of the world.
+
+        Every edge belongs to the tile of its first cell, and tiles are padded with a halo of neighbouring cells.
+        The exchange runs in two passes over chunks of tiles, which are independent tasks of the engine executor:
+        the first one sums up outflows of every cell, the second one moves the scaled fluxes. A task adds to the
+        cells of its own tiles and returns the halo strips, which are added to the neighbouring tiles in chunk order,
+        or gathered for cells of tiles which are not allocated yet.
+        """
+        world = self._engine.world
+        tile_ids = world.tile_ids()
+        if len(tile_ids) == 0:
+            return
+        D_factor = _diffusion_factor(total_mass)
+        # rows of neighbouring tiles in fixed size chunks, so results do not depend on the number of workers
+        tile_ids = tile_ids[np.lexsort((world.tile_origin[tile_ids, 0], world.tile_origin[tile_ids, 1]))]
+        chunks = [(chunk, world.tile_neighbours(chunk)) for chunk in split_tasks(tile_ids, STENCIL_CHUNK_TILES)]
+
+        outflow, kept_log = _clear_scratch(world, _OUTFLOW_FIELDS)
+        results = self._engine.executor.map(_outflow_task, world, [(*chunk, D_factor) for chunk in chunks])
+        for (_, neighbours), strips in zip(chunks, results):
+            for accumulator, accumulator_strips in zip((outflow, kept_log), strips):
+                _add_halo_strips(world, accumulator, accumulator_strips, neighbours)
+
+        # outflows of a cell are scaled as if its edges were processed one after another, like in the pairwise mode,
+        # so a cell never gives away more oil than it holds, whatever the order and number of its neighbours
+        scale = world.scratch("scale")
+        scale.fill(1.0)
+        np.divide(-np.expm1(kept_log) * world.oil_mass, outflow, out=scale, where=outflow > 0)
+
+        accumulators = _clear_scratch(world, _EXCHANGE_FIELDS)
+        results = self._engine.executor.map(_exchange_task, world, [(*chunk, D_factor) for chunk in chunks])
+        outside = [[] for _ in range(5)]  # coordinates and accumulators of cells in tiles not allocated yet
+        for (_, neighbours), (strips, chunk_outside) in zip(chunks, results):
+            for accumulator, accumulator_strips in zip(accumulators, strips):
+                _add_halo_strips(world, accumulator, accumulator_strips, neighbours)
+            for values, part in zip(outside, chunk_outside):
+                values.append(part)
+
+        self._merge_spread_oil(*accumulators)
+        xs, ys, inflow, inflow_viscosity, inflow_emulsification = map(np.concatenate, outside)
+        targets = world.slots_of(xs, ys, create=True)
+        inside = targets >= 0  # oil spread out of the simulation area is lost
+        world.scatter_add_oil(targets[inside], inflow[inside], (inflow_viscosity / inflow)[inside],
+                              (inflow_emulsification / inflow)[inside])
+
+    def _merge_spread_oil(self, scaled_outflow: np.ndarray, inflow: np.ndarray, inflow_viscosity: np.ndarray,
+                          inflow_emulsification: np.ndarray) -> None:
+        world = self._engine.world
+        changed = np.flatnonzero((scaled_outflow > 0) | (inflow > 0))
+        remaining = np.maximum(world.oil_mass[changed] - scaled_outflow[changed], 0)
+        new_mass = remaining + inflow[changed]
+        has_oil = new_mass > 0
+        viscosity = world.viscosity_dynamic[changed]
+        emulsification = world.emulsification_rate[changed]
+        viscosity[has_oil] = (remaining * viscosity + inflow_viscosity[changed])[has_oil] / new_mass[has_oil]
+        emulsification[has_oil] = ((remaining * emulsification + inflow_emulsification[changed])[has_oil]
+                                   / new_mass[has_oil])
+
+        # cells which received oil for the first time, cells out of the simulation area are left empty
+        new_cells = changed[~world.active[changed]]
+        world.slots_of(world.coords[new_cells, 0], world.coords[new_cells, 1], create=True)
+        stored = world.active[changed]
+        changed = changed[stored]
+        world.oil_mass[changed] = new_mass[stored]
+        world.viscosity_dynamic[changed] = viscosity[stored]
+        world.emulsification_rate[changed] = emulsification[stored]
+
     def new_point(self, coord: Coord_t, new_points: dict[Coord_t, Point]) -> Point:
         if coord in new_points:
             return new_points[coord]
@@ -41,6 +138,169 @@ class SpreadingEngine:
             self._engine.world[coord] = point
 
 
+def _outflow_task(world, tile_ids: np.ndarray, neighbours: np.ndarray, D_factor: float) -> list[list[np.ndarray]]:
+    mass, _, _, fluxes = _chunk_fluxes(world, tile_ids, neighbours, D_factor)
+    padded_outflow = np.zeros(mass.shape)
+    padded_kept_log = np.zeros(mass.shape)  # log of the part a cell keeps after giving to neighbours one by one
+    for first, second, flux in fluxes:
+        to_second, to_first = np.maximum(flux, 0), np.maximum(-flux, 0)
+        padded_outflow[first] += to_second
+        padded_outflow[second] += to_first
+        padded_kept_log[first] += np.log1p(-np.divide(to_second, mass[first], out=np.zeros_like(flux),
+                                                      where=to_second > 0))
+        padded_kept_log[second] += np.log1p(-np.divide(to_first, mass[second], out=np.zeros_like(flux),
+                                                       where=to_first > 0))
+    return [_add_interior(world, world.scratch(name), padded, neighbours)
+            for name, padded in zip(_OUTFLOW_FIELDS, (padded_outflow, padded_kept_log))]
+
+
+def _exchange_task(world, tile_ids: np.ndarray, neighbours: np.ndarray, D_factor: float) -> \
+        tuple[list[list[np.ndarray]], tuple[np.ndarray, ...]]:
+    mass, viscosity, emulsification, fluxes = _chunk_fluxes(world, tile_ids, neighbours, D_factor)
+    padded_scale = _gather(world, world.scratch("scale"), neighbours, 1.0)
+    padded = [np.zeros(mass.shape) for _ in _EXCHANGE_FIELDS]
+    scaled_outflow, inflow, inflow_viscosity, inflow_emulsification = padded
+    for first, second, flux in fluxes:
+        to_second = np.maximum(flux, 0) * padded_scale[first]
+        to_first = np.maximum(-flux, 0) * padded_scale[second]
+        scaled_outflow[first] += to_second
+        scaled_outflow[second] += to_first
+        inflow[second] += to_second
+        inflow[first] += to_first
+        inflow_viscosity[second] += to_second * viscosity[first]
+        inflow_viscosity[first] += to_first * viscosity[second]
+        inflow_emulsification[second] += to_second * emulsification[first]
+        inflow_emulsification[first] += to_first * emulsification[second]
+    strips = [_add_interior(world, world.scratch(name), padded_accumulator, neighbours)
+              for name, padded_accumulator in zip(_EXCHANGE_FIELDS, padded)]
+
+    unknown = ~_known_mask(neighbours) & (inflow > 0)
+    xs, ys = _padded_coords(world, tile_ids, unknown)
+    return strips, (xs, ys, inflow[unknown], inflow_viscosity[unknown], inflow_emulsification[unknown])
+
+
+def _chunk_fluxes(world, tile_ids: np.ndarray, neighbours: np.ndarray, D_factor: float) -> \
+        tuple[np.ndarray, np.ndarray, np.ndarray, list[tuple[tuple, tuple, np.ndarray]]]:
+    mass = _gather(world, world.oil_mass, neighbours, 0.0)
+    viscosity = _gather(world, world.viscosity_dynamic, neighbours, InitialValues.viscosity_dynamic)
+    emulsification = _gather(world, world.emulsification_rate, neighbours, 0.0)
+    sea = ~_gather(world, world.is_land, neighbours, False)
+
+    # topography of halo cells in tiles which are not allocated, only where oil may flow
+    unknown = ~_known_mask(neighbours)
+    lookup = unknown & _dilate(mass > 0)
+    if lookup.any():
+        xs, ys = _padded_coords(world, tile_ids, lookup)
+        sea[lookup] = ~world.is_land_many(xs, ys)
+
+    # an edge belongs to the tile of its first cell, or to the tile of its second cell if there is no first tile
+    interior = np.zeros(mass.shape[1:], dtype=bool)
+    interior[1:-1, 1:-1] = True
+    fluxes = []
+    for dx, dy in EDGE_DIRECTIONS[InitialValues.neighbourhood]:
+        first, second = _edge_slices(mass.shape[1:], dx, dy)
+        owned = interior[first] | (unknown[(slice(None),) + first] & interior[second])
+        first, second = (slice(None),) + first, (slice(None),) + second
+        kinematic_viscosity = (viscosity[first] + viscosity[second]) / 2 / InitialValues.oil_density
+        D = D_factor * kinematic_viscosity ** (-1 / 6)
+        flux = 0.5 * (mass[first] - mass[second]) * (
+                1 - np.exp(-2 * D / (InitialValues.point_side_size ** 2) * InitialValues.iter_as_sec))
+        flux[~(sea[first] & sea[second] & owned)] = 0
+        fluxes.append((first, second, flux))
+    return mass, viscosity, emulsification, fluxes
+
+
+def _clear_scratch(world, names: tuple[str, ...]) -> list[np.ndarray]:
+    accumulators = [world.scratch(name) for name in names]
+    for accumulator in accumulators:
+        accumulator.fill(0)
+    return accumulators
+
+
+def _diffusion_factor(total_mass: float) -> float:
+    """Part of the spreading coefficient D shared by all edges, D = factor * kinematic_viscosity ** (-1/6)."""
+    V = total_mass / InitialValues.oil_density
+    G = 9.8
+    delta = (InitialValues.water_density - InitialValues.oil_density) / InitialValues.water_density
+    return 0.48 / InitialValues.propagation_factor * (V ** 2 * G * delta) ** (1 / 3) / sqrt(InitialValues.iter_as_sec)
+
+
+def _halo_slices(d: int) -> tuple[slice, slice]:
+    """Along one axis: slice of a padded tile and the matching slice of its neighbour at offset d."""
+    size = WorldState.TILE_SIZE
+    if d < 0:
+        return slice(0, 1), slice(size - 1, size)
+    if d > 0:
+        return slice(size + 1, size + 2), slice(0, 1)
+    return slice(1, size + 1), slice(0, size)
+
+
+def _neighbour_halos(neighbours: np.ndarray, halo_only: bool = False):
+    for dy in (-1, 0, 1):
+        for dx in (-1, 0, 1):
+            if halo_only and dx == dy == 0:
+                continue
+            ids = neighbours[:, dy + 1, dx + 1]
+            has = ids >= 0
+            (padded_y, tile_y), (padded_x, tile_x) = _halo_slices(dy), _halo_slices(dx)
+            yield ids[has], has, (padded_y, padded_x), (tile_y, tile_x)
+
+
+def _gather(world, field: np.ndarray, neighbours: np.ndarray, fill) -> np.ndarray:
+    """Copies a slot-indexed field into tiles padded with one cell of halo, ``fill`` where there is no tile."""
+    size = WorldState.TILE_SIZE
+    tiles = world.tiles(field)
+    padded = np.full((len(neighbours), size + 2, size + 2), fill, dtype=field.dtype)
+    for ids, has, (padded_y, padded_x), (tile_y, tile_x) in _neighbour_halos(neighbours):
+        padded[has, padded_y, padded_x] = tiles[ids, tile_y, tile_x]
+    return padded
+
+
+def _add_interior(world, accumulator: np.ndarray, padded: np.ndarray, neighbours: np.ndarray) -> list[np.ndarray]:
+    """Adds padded tiles without their halo into a slot-indexed accumulator. Returns the halo strips."""
+    world.tiles(accumulator)[neighbours[:, 1, 1]] += padded[:, 1:-1, 1:-1]
+    return [padded[has, padded_y, padded_x]
+            for _, has, (padded_y, padded_x), _ in _neighbour_halos(neighbours, halo_only=True)]
+
+
+def _add_halo_strips(world, accumulator: np.ndarray, strips: list[np.ndarray], neighbours: np.ndarray) -> None:
+    """Adds halo strips of padded tiles into the neighbouring tiles. Halo of missing tiles is skipped."""
+    tiles = world.tiles(accumulator)
+    for strip, (ids, _, _, (tile_y, tile_x)) in zip(strips, _neighbour_halos(neighbours, halo_only=True)):
+        tiles[ids, tile_y, tile_x] += strip
+
+
+def _known_mask(neighbours: np.ndarray) -> np.ndarray:
+    size = WorldState.TILE_SIZE
+    known = np.zeros((len(neighbours), size + 2, size + 2), dtype=bool)
+    for _, has, (padded_y, padded_x), _ in _neighbour_halos(neighbours):
+        known[has, padded_y, padded_x] = True
+    return known
+
+
+def _dilate(mask: np.ndarray) -> np.ndarray:
+    dilated = mask.copy()
+    for dx, dy in EDGE_DIRECTIONS[Neighbourhood.MOORE]:
+        first, second = _edge_slices(mask.shape[1:], dx, dy)
+        dilated[(slice(None),) + second] |= mask[(slice(None),) + first]
+        dilated[(slice(None),) + first] |= mask[(slice(None),) + second]
+    return dilated
+
+
+def _padded_coords(world, tile_ids: np.ndarray, mask: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    tiles, ys, xs = np.nonzero(mask)
+    origin = world.tile_origin[tile_ids[tiles]]
+    return origin[:, 0] + xs - 1, origin[:, 1] + ys - 1
+
+
+def _edge_slices(shape: tuple[int, int], dx: int, dy: int) -> tuple[tuple[slice, slice], tuple[slice, slice]]:
+    """Slices selecting the first and the second cell of every (x, y) -> (x + dx, y + dy) edge of a grid."""
+    height, width = shape
+    first = (slice(max(0, -dy), height - max(0, dy)), slice(max(0, -dx), width - max(0, dx)))
+    second = (slice(max(0, dy), height - max(0, -dy)), slice(max(0, dx), width - max(0, -dx)))
+    return first, second
+
+
 def _process_spread_between(total_mass: float, first: Point, second: Point, is_new: bool) -> None:
     if not (first.topography == TopographyState.SEA and second.topography == TopographyState.SEA):
         return
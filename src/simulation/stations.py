@@ -0,0 +1,54 @@
+import numpy as np
+
+from initial_values import InitialValues
+from topology.math import get_coordinates_from_xy_many
+
+
+class WeatherStationGrid:
+    """
+    Weather station indices of the cells of the simulation grid. A station covers a lat/lon rectangle tens of
+    kilometres wide, so most blocks of cells lie in a single one, these are resolved at once from the corners of the
+    blocks when the grid is created. Blocks crossed by a border of stations are resolved cell by cell when first used.
+    """
+    BLOCK_SIZE = 64
+
+    def __init__(self, data_processor):
+        self._data_processor = data_processor
+        self._blocks_x = -(-InitialValues.point_side_lon_count // self.BLOCK_SIZE)
+        blocks_y = -(-InitialValues.point_side_lat_count // self.BLOCK_SIZE)
+        corner_ys, corner_xs = np.mgrid[0:blocks_y + 1, 0:self._blocks_x + 1] * self.BLOCK_SIZE
+        # corners are taken at the last cells of the preceding blocks and clamped to the grid, so the corners of every
+        # block enclose all its cells
+        corner_xs = np.minimum(corner_xs, InitialValues.point_side_lon_count - 1)
+        corner_ys = np.minimum(corner_ys, InitialValues.point_side_lat_count - 1)
+        corner_xs[:, 1:-1] -= 1
+        corner_ys[1:-1] -= 1
+        lats, lons = get_coordinates_from_xy_many(corner_xs.ravel(), corner_ys.ravel(), cached=False)
+        station_lats, station_lons = data_processor.weather_station_indices(lats, lons)
+        stations = np.stack([station_lats, station_lons], axis=-1).reshape(blocks_y + 1, self._blocks_x + 1, 2)
+        corners = [stations[:-1, :-1], stations[1:, :-1], stations[:-1, 1:], stations[1:, 1:]]
+        uniform = np.all([(corner == corners[0]).all(axis=-1) for corner in corners[1:]], axis=0)
+        self._block_stations = np.where(uniform[..., None], corners[0], -1).astype(np.int16)
+        self._mixed_blocks: dict[int, np.ndarray] = dict()  # block id -> (BLOCK_SIZE ** 2, 2) station indices
+
+    def _mixed_block(self, block_id: int) -> np.ndarray:
+        if block_id not in self._mixed_blocks:
+            block_y, block_x = divmod(block_id, self._blocks_x)
+            ys, xs = np.mgrid[block_y * self.BLOCK_SIZE:(block_y + 1) * self.BLOCK_SIZE,
+                              block_x * self.BLOCK_SIZE:(block_x + 1) * self.BLOCK_SIZE]
+            lats, lons = get_coordinates_from_xy_many(xs.ravel(), ys.ravel())
+            self._mixed_blocks[block_id] = np.column_stack(self._data_processor.weather_station_indices(lats, lons))
+        return self._mixed_blocks[block_id]
+
+    def stations(self, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        """Returns (n, 2) latitude and longitude station indices of cells inside the simulation area."""
+        block_x, local_x = np.divmod(xs, self.BLOCK_SIZE)
+        block_y, local_y = np.divmod(ys, self.BLOCK_SIZE)
+        stations = self._block_stations[block_y, block_x].astype(np.int64)
+        mixed = np.flatnonzero(stations[:, 0] < 0)
+        block_ids = block_y[mixed] * self._blocks_x + block_x[mixed]
+        local = local_y[mixed] * self.BLOCK_SIZE + local_x[mixed]
+        for block_id in np.unique(block_ids).tolist():
+            in_block = block_ids == block_id
+            stations[mixed[in_block]] = self._mixed_block(block_id)[local[in_block]]
+        return stations
@@ -6,6 +6,16 @@ class Neighbourhood(Enum):
     MOORE = 1
 
 
+class ProjectionMode(Enum):
+    GEODESIC = 0  # WGS84 geodesic solutions
+    LOCAL = 1  # polynomial fit of the geodesic solutions over the simulation area
+
+
+class PreprocessingMode(Enum):
+    EAGER = 0  # whole time range of the environment interpolated and saved before the simulation starts
+    LAZY = 1  # hours of the environment interpolated when the simulation gets close to them
+
+
 def get_neighbour_coordinates(x: int, y: int, neighbourhood: Neighbourhood) -> list[tuple[int, int]]:
     if neighbourhood == Neighbourhood.VON_NEUMANN:
         return [(x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)]
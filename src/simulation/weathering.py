@@ -0,0 +1,81 @@
+"""
+Batched counterparts of Point._process_emulsification, _process_evaporation, _process_natural_dispersion and
+_viscosity_change. They apply the same formulas in the same order to every given cell at once and agree with the
+per-Point code within a relative tolerance of 1e-9 (the only differences come from the order of float operations).
+"""
+import numpy as np
+
+from initial_values import InitialValues
+
+
+def _wind_speed(wind_velocity: np.ndarray) -> np.ndarray:
+    return np.hypot(wind_velocity[:, 0], wind_velocity[:, 1])
+
+
+def process_emulsification(emulsification_rate: np.ndarray, wind_speed: np.ndarray) -> np.ndarray:
+    K = 5.0e-7
+    old_emulsification_rate = emulsification_rate.copy()
+    emulsification_rate += InitialValues.iter_as_sec * K * (
+            ((wind_speed + 1) ** 2) * (1 - emulsification_rate / InitialValues.emulsion_max_content_water))
+    np.minimum(emulsification_rate, InitialValues.emulsion_max_content_water, out=emulsification_rate)
+    return emulsification_rate - old_emulsification_rate
+
+
+def process_evaporation(oil_mass: np.ndarray, temperature: np.ndarray,
+                        evaporation_rate: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    K = 1.25e-3
+    P = 1000 * np.exp(-(4.4 + np.log(InitialValues.boiling_point)) * (
+            1.803 * (InitialValues.boiling_point / temperature - 1) - 0.803 * np.log(
+        InitialValues.boiling_point / temperature)))  # [Pa]
+    R = 8.314  # [J/(mol*K)]
+
+    evaporation_rate[:] = (K * (InitialValues.molar_mass / 1000) * P) / (R * temperature)
+    evaporated_mass = np.minimum(
+        InitialValues.iter_as_sec * InitialValues.point_side_size * InitialValues.point_side_size * evaporation_rate,
+        oil_mass)
+    delta_f = np.divide(evaporated_mass, oil_mass, out=np.zeros_like(oil_mass), where=oil_mass > 0)
+    oil_mass -= evaporated_mass
+    return delta_f, evaporated_mass
+
+
+def process_natural_dispersion(oil_mass: np.ndarray, viscosity_dynamic: np.ndarray, evaporation_rate: np.ndarray,
+                               wind_speed: np.ndarray) -> np.ndarray:
+    Da = 0.11 * (wind_speed + 1) ** 2
+    interfacial_tension = InitialValues.interfacial_tension * (1 + evaporation_rate)
+    slick_thickness = (oil_mass / InitialValues.oil_density) / (InitialValues.point_side_size ** 2) * 100  # [cm]
+    # multiply viscosity by 100 to convert from Pa*s to cPa*s
+    Db = 1 / (1 + 50 * np.sqrt(viscosity_dynamic * 100) * slick_thickness * interfacial_tension)
+    dispersed_mass = oil_mass * Da * Db / (3600 * InitialValues.iter_as_sec)
+    oil_mass -= dispersed_mass
+    return dispersed_mass
+
+
+def viscosity_change(viscosity_dynamic: np.ndarray, oil_mass: np.ndarray, emulsification_rate: np.ndarray,
+                     delta_F: np.ndarray, delta_Y: np.ndarray) -> None:
+    viscosity_dynamic += InitialValues.c * viscosity_dynamic * delta_F + (
+            2.5 * viscosity_dynamic * delta_Y) / (
+                                 (1 - InitialValues.emulsion_max_content_water * emulsification_rate) ** 2)
+    viscosity_dynamic[oil_mass < 1] = InitialValues.viscosity_dynamic
+
+
+def process_weathering(world, slots: np.ndarray) -> tuple[float, float]:
+    """
+    Runs emulsification, evaporation, natural dispersion and viscosity change for the given sea cells of a WorldState.
+    Returns total evaporated and dispersed mass [kg].
+    """
+    wind_speed = _wind_speed(world.wind_velocity[slots])
+    oil_mass = world.oil_mass[slots]
+    emulsification_rate = world.emulsification_rate[slots]
+    evaporation_rate = world.evaporation_rate[slots]
+    viscosity_dynamic = world.viscosity_dynamic[slots]
+
+    delta_y = process_emulsification(emulsification_rate, wind_speed)
+    delta_f, evaporated_mass = process_evaporation(oil_mass, world.temperature[slots], evaporation_rate)
+    dispersed_mass = process_natural_dispersion(oil_mass, viscosity_dynamic, evaporation_rate, wind_speed)
+    viscosity_change(viscosity_dynamic, oil_mass, emulsification_rate, delta_f, delta_y)
+
+    world.oil_mass[slots] = oil_mass
+    world.emulsification_rate[slots] = emulsification_rate
+    world.evaporation_rate[slots] = evaporation_rate
+    world.viscosity_dynamic[slots] = viscosity_dynamic
+    return float(evaporated_mass.sum()), float(dispersed_mass.sum())
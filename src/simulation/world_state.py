@@ -0,0 +1,432 @@
+import heapq
+from typing import Iterator, Optional
+
+import numpy as np
+
+from data.data_processor import DataStationInfo, StationMeasurements
+from initial_values import InitialValues
+from simulation.parallel import ArrayDescriptor, IsLandFunction, SharedMemoryAllocator
+from simulation.point import Point, Coord_t, TopographyState, DEFAULT_TEMPERATURE, DEFAULT_WAVE_VELOCITY, \
+    DEFAULT_WIND_VELOCITY
+
+
+class WorldState:
+    """
+    Columnar store of the simulated cells.
+
+    The simulation area is split into square tiles of TILE_SIZE cells. A tile is allocated the first time oil reaches
+    it and released when it has no cells left. Once a quarter of the tiles is used, the last tiles are moved into the
+    free blocks and the arrays shrink by half, so memory scales with the slick footprint. Every allocated tile owns a
+    contiguous block of slots, and the state of its cells lives in slot-indexed NumPy arrays, which can also be viewed
+    as dense (tile, y, x) arrays. The store behaves like the former ``dict[Coord_t, Point]`` of the stored cells:
+    indexing it returns a ``Cell`` view, which keeps the GUI tooltip, checkpoints and per-cell code working.
+    """
+    TILE_SIZE = 64
+    TILE_CELLS = TILE_SIZE * TILE_SIZE
+    INITIAL_TILE_CAPACITY = 4
+
+    _SLOT_FIELDS = ("coords", "active", "is_land", "station", "oil_mass", "viscosity_dynamic", "emulsification_rate",
+                    "evaporation_rate", "temperature", "wind_velocity", "wave_velocity", "last_weather_update")
+    _TILE_FIELDS = ("tile_origin", "tile_allocated")
+
+    def __init__(self, engine, tile_capacity: int = INITIAL_TILE_CAPACITY,
+                 allocator: Optional[SharedMemoryAllocator] = None):
+        self._engine = engine
+        self._allocator = allocator  # arrays live in shared memory when set, so worker processes can attach to them
+        self.is_land_many: IsLandFunction = engine.is_land_many
+        self.land_mask: np.ndarray = engine.land_mask  # (y, x), 1 for land
+        self._scratch: dict[str, np.ndarray] = dict()
+        self._free_tiles: list[int] = []  # heap of released tiles below _tiles_used
+        self._tiles_used = 0  # tiles from this index on are free and not in _free_tiles
+        self._oil_buffers: dict[int, list] = dict()  # slot -> tuples (mass, viscosity, emulsification_rate)
+        self._count = 0
+
+        self.tile_index = np.full((-(-InitialValues.point_side_lat_count // self.TILE_SIZE),
+                                   -(-InitialValues.point_side_lon_count // self.TILE_SIZE)), -1, dtype=np.int64)
+        self.tile_origin = self._zeros((tile_capacity, 2), np.int64)  # (x, y) of the top left cell
+        self.tile_allocated = self._zeros(tile_capacity, bool)
+
+        capacity = tile_capacity * self.TILE_CELLS
+        self.coords = self._zeros((capacity, 2), np.int64)
+        self.active = self._zeros(capacity, bool)  # cell is stored, inactive cells hold the defaults
+        self.is_land = self._zeros(capacity, bool)
+        self.station = self._zeros((capacity, 2), np.int64)  # (latitude, longitude) weather station index
+        self.oil_mass = self._zeros(capacity, np.float64)  # [kg]
+        self.viscosity_dynamic = self._zeros(capacity, np.float64)  # [Pa*s]
+        self.emulsification_rate = self._zeros(capacity, np.float64)
+        self.evaporation_rate = self._zeros(capacity, np.float64)
+        self.temperature = self._zeros(capacity, np.float64)  # [K]
+        self.wind_velocity = self._zeros((capacity, 2), np.float64)  # [m/s] (north, east)
+        self.wave_velocity = self._zeros((capacity, 2), np.float64)  # [m/s] (north, east)
+        self.last_weather_update = self._zeros(capacity, np.float64)  # [s] since the data start, NaN if never updated
+
+    @classmethod
+    def from_arrays(cls, fields: dict[str, np.ndarray], scratch: dict[str, np.ndarray], is_land_many: IsLandFunction,
+                    land_mask: np.ndarray) -> 'WorldState':
+        """State over existing arrays, used by step tasks in worker processes. It can not allocate cells."""
+        world = cls.__new__(cls)
+        world._engine = None
+        world._allocator = None
+        world.is_land_many = is_land_many
+        world.land_mask = land_mask
+        world._scratch = scratch
+        for name, array in fields.items():
+            setattr(world, name, array)
+        return world
+
+    def shared_descriptor(self) -> tuple[dict[str, ArrayDescriptor], dict[str, ArrayDescriptor]]:
+        fields = self._SLOT_FIELDS + self._TILE_FIELDS
+        return ({name: self._allocator.descriptor(getattr(self, name)) for name in fields},
+                {name: self._allocator.descriptor(array) for name, array in self._scratch.items()})
+
+    def _zeros(self, shape, dtype) -> np.ndarray:
+        if self._allocator is None:
+            return np.zeros(shape, dtype=dtype)
+        return self._allocator.zeros(shape if isinstance(shape, tuple) else (shape,), dtype)
+
+    def _free(self, array: np.ndarray) -> None:
+        if self._allocator is not None:
+            self._allocator.release(array)
+
+    def release(self) -> None:
+        """Frees the shared memory of the state, it can not be used afterwards."""
+        for name in self._SLOT_FIELDS + self._TILE_FIELDS:
+            self._free(getattr(self, name))
+        for array in self._scratch.values():
+            self._free(array)
+        self._scratch.clear()
+
+    def scratch(self, name: str) -> np.ndarray:
+        """Slot-indexed float array for accumulators of a step, shared with step tasks. It is not cleared."""
+        array = self._scratch.get(name)
+        if array is None or len(array) != len(self.oil_mass):
+            if array is not None:
+                self._free(array)
+            array = self._zeros(len(self.oil_mass), np.float64)
+            self._scratch[name] = array
+        return array
+
+    @property
+    def tile_capacity(self) -> int:
+        return len(self.tile_allocated)
+
+    def tiles(self, field: np.ndarray) -> np.ndarray:
+        """View of a slot-indexed array as (tile, y, x, ...) array."""
+        return field.reshape((-1, self.TILE_SIZE, self.TILE_SIZE) + field.shape[1:])
+
+    def tile_ids(self) -> np.ndarray:
+        return np.flatnonzero(self.tile_allocated)
+
+    def tile_neighbours(self, tile_ids: np.ndarray) -> np.ndarray:
+        """Returns (tile, dy + 1, dx + 1) ids of neighbouring tiles, -1 where there is none."""
+        tiles_y, tiles_x = self.tile_index.shape
+        tile_x = self.tile_origin[tile_ids, 0] // self.TILE_SIZE
+        tile_y = self.tile_origin[tile_ids, 1] // self.TILE_SIZE
+        neighbours = np.full((len(tile_ids), 3, 3), -1, dtype=np.int64)
+        for dy in (-1, 0, 1):
+            for dx in (-1, 0, 1):
+                x, y = tile_x + dx, tile_y + dy
+                inside = (0 <= x) & (x < tiles_x) & (0 <= y) & (y < tiles_y)
+                neighbours[inside, dy + 1, dx + 1] = self.tile_index[y[inside], x[inside]]
+        return neighbours
+
+    def _resize(self, tile_capacity: int) -> None:
+        """Grows or shrinks the arrays, tiles from _tiles_used on are dropped when shrinking."""
+        for name in self._SLOT_FIELDS + self._TILE_FIELDS:
+            old = getattr(self, name)
+            size = tile_capacity * (self.TILE_CELLS if name in self._SLOT_FIELDS else 1)
+            new = self._zeros((size,) + old.shape[1:], old.dtype)
+            kept = min(size, len(old))
+            new[:kept] = old[:kept]
+            setattr(self, name, new)
+            self._free(old)
+        for array in self._scratch.values():
+            self._free(array)
+        self._scratch.clear()
+
+    def _take_tile(self) -> int:
+        if self._free_tiles:
+            return heapq.heappop(self._free_tiles)
+        if self._tiles_used == self.tile_capacity:
+            self._resize(2 * self.tile_capacity)
+        self._tiles_used += 1
+        return self._tiles_used - 1
+
+    def _allocate_tiles(self, tile_xs: np.ndarray, tile_ys: np.ndarray) -> None:
+        local_y, local_x = np.divmod(np.arange(self.TILE_CELLS), self.TILE_SIZE)
+        new_slots = []
+        for tile_x, tile_y in zip(tile_xs.tolist(), tile_ys.tolist()):
+            tile = self._take_tile()
+            self.tile_index[tile_y, tile_x] = tile
+            self.tile_origin[tile] = (tile_x * self.TILE_SIZE, tile_y * self.TILE_SIZE)
+            self.tile_allocated[tile] = True
+            slots = np.arange(tile * self.TILE_CELLS, (tile + 1) * self.TILE_CELLS)
+            self.coords[slots, 0] = self.tile_origin[tile, 0] + local_x
+            self.coords[slots, 1] = self.tile_origin[tile, 1] + local_y
+            new_slots.append(slots)
+        slots = np.concatenate(new_slots)
+        self.is_land[slots] = self.is_land_many(self.coords[slots, 0], self.coords[slots, 1])
+        self._reset(slots)
+
+    def _reset(self, slots: np.ndarray) -> None:
+        self.active[slots] = False
+        self.oil_mass[slots] = 0
+        self.viscosity_dynamic[slots] = InitialValues.viscosity_dynamic
+        self.emulsification_rate[slots] = 0
+        self.evaporation_rate[slots] = 0
+        self.temperature[slots] = DEFAULT_TEMPERATURE
+        self.wind_velocity[slots] = DEFAULT_WIND_VELOCITY
+        self.wave_velocity[slots] = DEFAULT_WAVE_VELOCITY
+        self.last_weather_update[slots] = np.nan
+
+    def _activate(self, slots: np.ndarray) -> None:
+        self._reset(slots)
+        self.active[slots] = True
+        self.station[slots] = self._engine.station_grid.stations(self.coords[slots, 0], self.coords[slots, 1])
+        self._count += len(slots)
+
+    def set_weather(self, slots: np.ndarray, measurements: StationMeasurements, time: float) -> None:
+        """Sets weather of the given cells from measurements of their weather stations."""
+        station_lats, station_lons = self.station[slots, 0], self.station[slots, 1]
+        self.wind_velocity[slots] = measurements.wind[station_lats, station_lons]
+        self.wave_velocity[slots] = measurements.current[station_lats, station_lons]
+        self.temperature[slots] = measurements.temperature[station_lats, station_lons]
+        self.last_weather_update[slots] = time
+
+    def release_empty_tiles(self) -> None:
+        tile_ids = self.tile_ids()
+        empty = tile_ids[~self.tiles(self.active)[tile_ids].any(axis=(1, 2))]
+        if len(empty) == 0:
+            return
+        for tile in empty.tolist():
+            tile_x, tile_y = self.tile_origin[tile] // self.TILE_SIZE
+            self.tile_index[tile_y, tile_x] = -1
+            self.tile_allocated[tile] = False
+            heapq.heappush(self._free_tiles, tile)
+
+        allocated = self.tile_ids()
+        tile_capacity = self.tile_capacity
+        while tile_capacity > self.INITIAL_TILE_CAPACITY and len(allocated) <= tile_capacity // 4:
+            tile_capacity //= 2
+        if tile_capacity < self.tile_capacity:
+            moved = allocated[allocated >= tile_capacity]
+            self._move_tiles(moved, np.setdiff1d(np.arange(tile_capacity), allocated)[:len(moved)])
+            allocated = self.tile_ids()
+        self._tiles_used = int(allocated[-1]) + 1 if len(allocated) else 0
+        self._free_tiles = np.setdiff1d(np.arange(self._tiles_used), allocated).tolist()  # sorted, so a heap
+        if tile_capacity < self.tile_capacity:
+            self._resize(tile_capacity)
+
+    def _move_tiles(self, tiles: np.ndarray, targets: np.ndarray) -> None:
+        """Moves the cells of allocated tiles to free tiles, their slots change."""
+        for name in self._SLOT_FIELDS:
+            field = self.tiles(getattr(self, name))
+            field[targets] = field[tiles]
+        self.tile_origin[targets] = self.tile_origin[tiles]
+        self.tile_allocated[targets] = True
+        self.tile_allocated[tiles] = False
+        self.tile_index[self.tile_origin[targets, 1] // self.TILE_SIZE,
+                        self.tile_origin[targets, 0] // self.TILE_SIZE] = targets
+        target_of = dict(zip(tiles.tolist(), targets.tolist()))
+        self._oil_buffers = {
+            target_of[slot // self.TILE_CELLS] * self.TILE_CELLS + slot % self.TILE_CELLS
+            if slot // self.TILE_CELLS in target_of else slot: buffer
+            for slot, buffer in self._oil_buffers.items()}
+
+    def add(self, coord: Coord_t) -> 'Cell':
+        """Allocates an empty cell, or returns the existing one."""
+        slot = self.slots_of(np.array([coord[0]]), np.array([coord[1]]), create=True)[0]
+        if slot < 0:
+            raise KeyError(f"Coordinate {coord} is out of the simulation area")
+        return Cell(self, slot)
+
+    def cell(self, slot: int) -> 'Cell':
+        return Cell(self, slot)
+
+    def slot_of(self, coord: Coord_t) -> Optional[int]:
+        """Scalar slots_of, without array allocations, for the dict-like access of single cells."""
+        x, y = int(coord[0]), int(coord[1])
+        if not (0 <= x < InitialValues.point_side_lon_count and 0 <= y < InitialValues.point_side_lat_count):
+            return None
+        tile = int(self.tile_index[y // self.TILE_SIZE, x // self.TILE_SIZE])
+        if tile < 0:
+            return None
+        slot = tile * self.TILE_CELLS + (y % self.TILE_SIZE) * self.TILE_SIZE + x % self.TILE_SIZE
+        return slot if self.active[slot] else None
+
+    def slots_of(self, xs: np.ndarray, ys: np.ndarray, create: bool = False) -> np.ndarray:
+        """
+        Returns slots of the given cells, -1 for cells which are not stored.
+        With ``create`` set, missing cells inside the simulation area are allocated.
+        """
+        xs, ys = np.asarray(xs, dtype=np.int64), np.asarray(ys, dtype=np.int64)
+        slots = np.full(len(xs), -1, dtype=np.int64)
+        inside = np.flatnonzero((0 <= xs) & (xs < InitialValues.point_side_lon_count) &
+                                (0 <= ys) & (ys < InitialValues.point_side_lat_count))
+        tile_x, local_x = np.divmod(xs[inside], self.TILE_SIZE)
+        tile_y, local_y = np.divmod(ys[inside], self.TILE_SIZE)
+        tiles = self.tile_index[tile_y, tile_x]
+        if create and (tiles < 0).any():
+            missing = np.unique(tile_y[tiles < 0] * self.tile_index.shape[1] + tile_x[tiles < 0])
+            self._allocate_tiles(missing % self.tile_index.shape[1], missing // self.tile_index.shape[1])
+            tiles = self.tile_index[tile_y, tile_x]
+
+        found = tiles >= 0
+        inside, tiles, local_x, local_y = inside[found], tiles[found], local_x[found], local_y[found]
+        found_slots = tiles * self.TILE_CELLS + local_y * self.TILE_SIZE + local_x
+        if create:
+            self._activate(np.unique(found_slots[~self.active[found_slots]]))
+        slots[inside] = np.where(self.active[found_slots], found_slots, -1)
+        return slots
+
+    def scatter_add_oil(self, targets: np.ndarray, mass: np.ndarray, viscosity: np.ndarray,
+                        emulsification: np.ndarray) -> None:
+        """Adds oil portions to the target slots, mixing viscosity and emulsification rate weighted by mass."""
+        if len(targets) == 0:
+            return
+        touched, index = np.unique(targets, return_inverse=True)
+        inflow = np.bincount(index, weights=mass)
+        inflow_viscosity = np.bincount(index, weights=mass * viscosity)
+        inflow_emulsification = np.bincount(index, weights=mass * emulsification)
+
+        own_mass = self.oil_mass[touched]
+        new_mass = own_mass + inflow
+        self.viscosity_dynamic[touched] = (own_mass * self.viscosity_dynamic[touched] + inflow_viscosity) / new_mass
+        self.emulsification_rate[touched] = (own_mass * self.emulsification_rate[touched]
+                                             + inflow_emulsification) / new_mass
+        self.oil_mass[touched] = new_mass
+
+    def active_slots(self) -> np.ndarray:
+        return np.flatnonzero(self.active)
+
+    def oil_buffer(self, slot: int) -> list:
+        return self._oil_buffers.setdefault(slot, [])
+
+    def set_oil_buffer(self, slot: int, buffer: list) -> None:
+        if buffer:
+            self._oil_buffers[slot] = buffer
+        else:
+            self._oil_buffers.pop(slot, None)
+
+    def remove(self, slots: np.ndarray) -> list[Coord_t]:
+        """Removes the cells of given slots, their oil is dropped. Returns their coordinates."""
+        slots = slots[self.active[slots]]
+        for slot in slots.tolist():
+            self._oil_buffers.pop(slot, None)
+        self._reset(slots)
+        self._count -= len(slots)
+        return [(x, y) for x, y in self.coords[slots].tolist()]
+
+    def __contains__(self, coord: Coord_t) -> bool:
+        return self.slot_of(coord) is not None
+
+    def __getitem__(self, coord: Coord_t) -> 'Cell':
+        slot = self.slot_of(coord)
+        if slot is None:
+            raise KeyError(coord)
+        return Cell(self, slot)
+
+    def __setitem__(self, coord: Coord_t, point: Point) -> None:
+        if isinstance(point, Cell) and point._state is self and point.coord == coord:
+            return
+        cell = self.add(coord)
+        cell.oil_mass = point.oil_mass
+        cell.viscosity_dynamic = point.viscosity_dynamic
+        cell.emulsification_rate = point.emulsification_rate
+        cell.evaporation_rate = point.evaporation_rate
+        cell.oil_buffer = cell.oil_buffer + point.oil_buffer
+
+    def __delitem__(self, coord: Coord_t) -> None:
+        slot = self.slot_of(coord)
+        if slot is None:
+            raise KeyError(coord)
+        self.remove(np.array([slot]))
+
+    def __iter__(self) -> Iterator[Coord_t]:
+        return iter(self.keys())
+
+    def __len__(self) -> int:
+        return self._count
+
+    def keys(self) -> list[Coord_t]:
+        return [(x, y) for x, y in self.coords[self.active_slots()].tolist()]
+
+    def values(self) -> Iterator['Cell']:
+        return (Cell(self, slot) for slot in self.active_slots().tolist())
+
+    def items(self) -> Iterator[tuple[Coord_t, 'Cell']]:
+        slots = self.active_slots()
+        return (((x, y), Cell(self, slot)) for (x, y), slot in zip(self.coords[slots].tolist(), slots.tolist()))
+
+
+def _column(name: str) -> property:
+    def getter(self: 'Cell'):
+        return getattr(self._state, name)[self._slot]
+
+    def setter(self: 'Cell', value) -> None:
+        getattr(self._state, name)[self._slot] = value
+
+    return property(getter, setter)
+
+
+class Cell(Point):
+    """
+    Thin ``Point`` view of one slot of a ``WorldState``.
+
+    It reads and writes the columnar arrays, so ``Point`` physics and every ``Point`` consumer work on it unchanged.
+    """
+
+    def __init__(self, state: WorldState, slot: int):
+        self._state = state
+        self._slot = slot
+
+    @property
+    def slot(self) -> int:
+        return self._slot
+
+    _oil_mass = _column("oil_mass")
+    _viscosity_dynamic = _column("viscosity_dynamic")
+    _emulsification_rate = _column("emulsification_rate")
+    _evaporation_rate = _column("evaporation_rate")
+    _temperature = _column("temperature")
+    _wind_velocity = _column("wind_velocity")
+    _wave_velocity = _column("wave_velocity")
+
+    @property
+    def _engine(self):
+        return self._state._engine
+
+    @property
+    def _data_processor(self):
+        return self._state._engine.data_processor
+
+    @property
+    def _coord(self) -> Coord_t:
+        x, y = self._state.coords[self._slot]
+        return int(x), int(y)
+
+    @property
+    def _topography(self) -> TopographyState:
+        return TopographyState.LAND if self._state.is_land[self._slot] else TopographyState.SEA
+
+    @property
+    def weather_station_coordinates(self) -> DataStationInfo:
+        latitude, longitude = self._state.station[self._slot]
+        return DataStationInfo(latitude=int(latitude), longitude=int(longitude))
+
+    @property
+    def _last_weather_update_time(self) -> Optional[int]:
+        seconds = self._state.last_weather_update[self._slot]
+        return None if np.isnan(seconds) else int(seconds)
+
+    @_last_weather_update_time.setter
+    def _last_weather_update_time(self, value: int) -> None:
+        self._state.last_weather_update[self._slot] = value
+
+    @property
+    def oil_buffer(self) -> list:
+        return self._state.oil_buffer(self._slot)
+
+    @oil_buffer.setter
+    def oil_buffer(self, value: list) -> None:
+        self._state.set_oil_buffer(self._slot, value)
@@ -0,0 +1,103 @@
+import sys
+from copy import deepcopy
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import files  # noqa: E402
+from data import data_processor  # noqa: E402
+from data.data_processor import DataStationInfo, StationMeasurements  # noqa: E402
+from data.measurement_data import Coordinates  # noqa: E402
+from initial_values import InitialValues  # noqa: E402
+from simulation import simulation  # noqa: E402
+from simulation.utilities import Neighbourhood  # noqa: E402
+
+TEST_DATA_PATHS = sorted(Path(__file__).resolve().parents[2].joinpath("data/test_data").glob("*.csv"))
+
+
+class FakeDataProcessor:
+    """Weather stations on a 10x10 grid with steady weather, which differs between stations."""
+    STATIONS = 10
+
+    data_time_step = 1800
+    time_start = InitialValues.simulation_initial_parameters.time.min
+
+    def close(self) -> None:
+        pass
+
+    def should_update_data(self, time_from_last_update: int) -> bool:
+        return time_from_last_update > self.data_time_step
+
+    def weather_station_coordinates(self, coordinates: Coordinates) -> DataStationInfo:
+        station_lats, station_lons = self.weather_station_indices(np.array([coordinates.latitude]),
+                                                                  np.array([coordinates.longitude]))
+        return DataStationInfo(latitude=int(station_lats[0]), longitude=int(station_lons[0]))
+
+    def weather_station_indices(self, lats: np.ndarray, lons: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        return ((lats - 28) * 30).astype(np.int64) % self.STATIONS, ((lons + 90) * 30).astype(np.int64) % self.STATIONS
+
+    def get_station_measurements(self, time: int) -> StationMeasurements:
+        station_lats, station_lons = np.indices((self.STATIONS, self.STATIONS))
+        wind = np.stack([0.3 + 0.1 * station_lats, 0.2 - 0.1 * station_lons], axis=-1)
+        current = np.stack([0.05 * station_lons, np.full(station_lons.shape, 0.03)], axis=-1)
+        return StationMeasurements(wind=wind, current=current, temperature=290.0 + station_lats)
+
+
+def sea_slick(world) -> np.ndarray:
+    """Oil with random weather on sea cells, some of them close to the coast of land_mask, returns their slots."""
+    rng = np.random.default_rng(1)
+    ys, xs = np.mgrid[10:90, 30:100]
+    slots = world.slots_of(xs.ravel(), ys.ravel(), create=True)
+    slots = slots[~world.is_land[slots]]
+    world.oil_mass[slots] = rng.uniform(100, 10000, len(slots))
+    world.viscosity_dynamic[slots] = rng.uniform(0.5, 2, len(slots)) * InitialValues.viscosity_dynamic
+    world.emulsification_rate[slots] = rng.uniform(0, 0.5, len(slots))
+    world.temperature[slots] = rng.uniform(285, 305, len(slots))
+    world.wind_velocity[slots] = rng.normal(0, 8, (len(slots), 2))
+    world.wave_velocity[slots] = rng.normal(0, 4, (len(slots), 2))
+    return slots
+
+
+@pytest.fixture
+def grid(monkeypatch):
+    """Small simulation grid in the Gulf of Mexico, InitialValues are restored after the test."""
+    for name, value in {"point_side_lon_count": 120, "point_side_lat_count": 100, "point_side_size": 500,
+                        "top_left_coord": Coordinates(latitude=29.0, longitude=-89.0),
+                        "neighbourhood": Neighbourhood.MOORE, "iter_as_sec": 60, "simulation_time": 24 * 3600,
+                        "total_simulation_time": 0, "checkpoint_frequency": 0,
+                        "simulation_initial_parameters": deepcopy(InitialValues.simulation_initial_parameters)}.items():
+        monkeypatch.setattr(InitialValues, name, value)
+
+
+@pytest.fixture
+def land_mask(grid) -> np.ndarray:
+    """Land east of x = 100 and in the south-east corner of the grid."""
+    ys, xs = np.indices((InitialValues.point_side_lat_count, InitialValues.point_side_lon_count))
+    return ((xs > 100) | ((ys > 80) & (xs > 60))).astype(np.uint8)
+
+
+@pytest.fixture
+def make_engine(monkeypatch, land_mask):
+    """Creates simulation engines over land_mask, closed after the test."""
+    engines = []
+
+    def make(data_processor=None, land_mask: np.ndarray = land_mask, **kwargs) -> simulation.SimulationEngine:
+        monkeypatch.setattr(simulation, "load_topography", lambda: land_mask.copy())
+        engine = simulation.SimulationEngine(data_processor or FakeDataProcessor(), **kwargs)
+        engines.append(engine)
+        return engine
+
+    yield make
+    for engine in engines:
+        engine.close()
+
+
+@pytest.fixture
+def processed_data_path(tmp_path, monkeypatch) -> Path:
+    path = tmp_path.joinpath("processed_data")
+    monkeypatch.setattr(files, "get_processed_data_path", lambda: path)
+    monkeypatch.setattr(data_processor, "get_processed_data_path", lambda: path)
+    return path
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from conftest import sea_slick
+from initial_values import InitialValues
+from simulation.advection import process_advection
+from simulation.parallel import SerialExecutor
+from simulation.utilities import Neighbourhood
+
+
+@pytest.mark.parametrize("neighbourhood", [Neighbourhood.MOORE, Neighbourhood.VON_NEUMANN])
+def test_advection_matches_point(make_engine, monkeypatch, neighbourhood):
+    monkeypatch.setattr(InitialValues, "neighbourhood", neighbourhood)
+    monkeypatch.setattr(InitialValues, "iter_as_sec", 600)  # moves over several cells, so the land check matters
+    batched, reference = make_engine(), make_engine()
+    batched_slots, reference_slots = sea_slick(batched.world), sea_slick(reference.world)
+
+    process_advection(batched.world, batched_slots, SerialExecutor())
+    for slot in reference_slots.tolist():
+        reference.world.cell(slot)._process_advection()
+    for slot in reference.world.active_slots().tolist():
+        reference.world.cell(slot).pour_from_buffer()
+
+    world = reference.world
+    slots = world.active_slots()
+    cells = [world.cell(slot) for slot in slots.tolist()]
+    buffered = np.array([sum(mass for mass, _, _ in cell.oil_buffer) for cell in cells])
+    poured = np.array([not cell.oil_buffer for cell in cells])  # buffers below 1 kg are not poured
+    batched_by_coord = dict(zip(map(tuple, batched.world.coords[batched.world.active_slots()].tolist()),
+                                batched.world.active_slots().tolist()))
+    assert batched_by_coord.keys() == set(map(tuple, world.coords[slots].tolist()))
+    batched_slots = np.array([batched_by_coord[coord] for coord in map(tuple, world.coords[slots].tolist())])
+
+    assert np.allclose(batched.world.oil_mass[batched_slots], world.oil_mass[slots] + buffered, rtol=1e-9, atol=1e-9)
+    for name in ("viscosity_dynamic", "emulsification_rate"):
+        assert np.allclose(getattr(batched.world, name)[batched_slots][poured], getattr(world, name)[slots][poured],
+                           rtol=1e-9), name
+    assert buffered.sum() < 1e-6 * world.oil_mass[slots].sum()
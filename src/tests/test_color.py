@@ -0,0 +1,11 @@
+import numpy as np
+
+from color import blend_color, blend_colors
+from initial_values import InitialValues
+
+
+def test_blend_colors_matches_blend_color():
+    ratios = np.random.default_rng(0).uniform(0, 3, 1000)
+    expected = [blend_color(InitialValues.OIL_COLOR, InitialValues.SEA_COLOR, ratio) for ratio in ratios.tolist()]
+    assert [tuple(color) for color in
+            blend_colors(InitialValues.OIL_COLOR, InitialValues.SEA_COLOR, ratios).tolist()] == expected
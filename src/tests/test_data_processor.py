@@ -0,0 +1,209 @@
+import json
+import threading
+from copy import deepcopy
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import TEST_DATA_PATHS
+from data.data_processor import DEFAULT_MEASUREMENT, MEASUREMENT_VARIABLES, DataAggregationDescriptor, DataProcessor, \
+    LoadedData
+from data.measurement_data import SpeedMeasure
+from initial_values import InitialValues
+from simulation.utilities import PreprocessingMode
+
+
+def _entries(processed_data_path) -> list[str]:
+    return sorted(directory.name for directory in processed_data_path.iterdir())
+
+
+def test_preprocessed_data_does_not_depend_on_the_order_of_files(processed_data_path):
+    parameters = InitialValues.simulation_initial_parameters
+    first = DataProcessor(TEST_DATA_PATHS, deepcopy(parameters))
+    second = DataProcessor(TEST_DATA_PATHS[::-1], deepcopy(parameters))
+
+    assert len(_entries(processed_data_path)) == 1
+    for time in range(0, 24 * 3600, 1800):
+        assert np.array_equal(first.get_station_measurements(time).wind, second.get_station_measurements(time).wind)
+
+
+def test_runs_with_other_data_or_parameters_get_own_preprocessed_data(processed_data_path, tmp_path):
+    parameters = InitialValues.simulation_initial_parameters
+    DataProcessor(TEST_DATA_PATHS, deepcopy(parameters))
+    other_parameters = deepcopy(parameters)
+    other_parameters.time.max = parameters.time.max - pd.Timedelta(hours=6)
+    DataProcessor(TEST_DATA_PATHS, other_parameters)
+    changed_file = tmp_path.joinpath("changed.csv")
+    changed_file.write_text(TEST_DATA_PATHS[0].read_text().replace("6.2", "6.3"))
+    DataProcessor(TEST_DATA_PATHS[1:] + [changed_file], deepcopy(parameters))
+
+    assert len(_entries(processed_data_path)) == 3
+
+
+def test_least_recently_used_preprocessed_data_is_evicted(processed_data_path, monkeypatch):
+    parameters = InitialValues.simulation_initial_parameters
+    first = DataProcessor(TEST_DATA_PATHS, deepcopy(parameters))
+    entry_size = sum(file.stat().st_size for file in processed_data_path.rglob("*"))
+    monkeypatch.setattr(InitialValues, "processed_data_max_size", 2 * entry_size + entry_size // 2)
+    shorter_parameters = [deepcopy(parameters) for _ in range(2)]
+    for hours, shorter in zip((1, 2), shorter_parameters):
+        shorter.time.max = parameters.time.max - pd.Timedelta(hours=hours)
+    DataProcessor(TEST_DATA_PATHS, shorter_parameters[0])
+    first_entry = set(_entries(processed_data_path))
+    DataProcessor(TEST_DATA_PATHS, deepcopy(parameters))  # uses the first entry again
+    DataProcessor(TEST_DATA_PATHS, shorter_parameters[1])
+
+    entries = set(_entries(processed_data_path))
+    assert len(entries) == 2
+    assert first._impl._cache_key in entries
+    assert not first_entry <= entries
+
+
+def test_loaded_data_gives_defaults_outside_of_its_time_range():
+    measurements = np.arange(2 * 3 * 4 * 5, dtype=np.float32).reshape((2, 3, 4, 5))
+    loaded_data = LoadedData(measurements, first_time_index=6)
+
+    inside = loaded_data.get_station_measurements(7)
+    assert np.array_equal(inside.wind, measurements[1, ..., 0:2])
+    assert np.array_equal(inside.temperature, measurements[1, ..., 4])
+    assert loaded_data.try_get_measurement(7, 2, 3).temperature == measurements[1, 2, 3, 4]
+    for time_index in (5, 8):
+        outside = loaded_data.get_station_measurements(time_index)
+        assert outside.temperature.shape == (3, 4)
+        assert np.all(outside.temperature == np.float32(DEFAULT_MEASUREMENT[4]))
+        assert loaded_data.try_get_measurement(time_index, 2, 3).temperature == DEFAULT_MEASUREMENT[4]
+
+
+def test_preprocessed_data_is_a_memory_mapped_cube_with_a_header(processed_data_path):
+    parameters = InitialValues.simulation_initial_parameters
+    preprocessed = DataProcessor(TEST_DATA_PATHS, deepcopy(parameters))
+    (entry,) = processed_data_path.iterdir()
+
+    environment = np.load(entry.joinpath("environment.npy"))
+    header = json.loads(entry.joinpath("environment.json").read_text())
+    assert environment.dtype == np.float32
+    assert environment.shape == (len(preprocessed._impl._time_points), len(header["latitude"]),
+                                 len(header["longitude"]), len(MEASUREMENT_VARIABLES))
+    assert header["axes"] == ["time", "latitude", "longitude", "variable"]
+    assert header["variables"] == [variable.value for variable in MEASUREMENT_VARIABLES]
+    assert header["time_step"] == preprocessed.data_time_step
+    assert header["time_start"] == str(parameters.time.min)
+
+    loaded = DataProcessor(TEST_DATA_PATHS, deepcopy(parameters))
+    assert isinstance(loaded._impl._environment, np.memmap)
+    for time in (0, 5400, 23 * 3600):
+        expected, measurements = preprocessed.get_station_measurements(time), loaded.get_station_measurements(time)
+        assert np.array_equal(measurements.wind, expected.wind)
+        assert np.array_equal(measurements.current, expected.current)
+        assert np.array_equal(measurements.temperature, expected.temperature)
+        assert np.array_equal(measurements.temperature, environment[time // preprocessed.data_time_step, ..., 4])
+
+    # data which does not match the header is preprocessed again
+    header["time_step"] += 1
+    entry.joinpath("environment.json").write_text(json.dumps(header))
+    DataProcessor(TEST_DATA_PATHS, deepcopy(parameters))
+    assert json.loads(entry.joinpath("environment.json").read_text())["time_step"] == preprocessed.data_time_step
+
+
+def test_lazy_preprocessing_gives_eager_measurements(processed_data_path):
+    parameters = InitialValues.simulation_initial_parameters
+    lazy = DataProcessor(TEST_DATA_PATHS, deepcopy(parameters), 1, PreprocessingMode.LAZY)
+    assert not processed_data_path.exists() or not any(processed_data_path.iterdir())
+    eager = DataProcessor(TEST_DATA_PATHS, deepcopy(parameters), 2)
+
+    for time in (0, 1800, 7 * 3600 + 60, 23 * 3600 + 1799):
+        expected, measurements = eager.get_station_measurements(time), lazy.get_station_measurements(time)
+        assert np.array_equal(measurements.wind, expected.wind)
+        assert np.array_equal(measurements.current, expected.current)
+        assert np.array_equal(measurements.temperature, expected.temperature)
+
+
+def test_following_hours_are_prefetched_in_the_background(processed_data_path, monkeypatch):
+    parameters = InitialValues.simulation_initial_parameters
+    data = DataProcessor(TEST_DATA_PATHS, deepcopy(parameters))
+    impl = data._impl
+    loading_threads = []
+    load_data_for_time = impl._load_data_for_time
+
+    def recording_load(simulation_hour):
+        loading_threads.append(threading.current_thread())
+        return load_data_for_time(simulation_hour)
+
+    monkeypatch.setattr(impl, "_load_data_for_time", recording_load)
+
+    data.get_station_measurements(0)
+    assert sorted(impl._loaded_hours) == list(range(0, 1 + impl.PREFETCH_HOURS))
+    prefetched = {hour: future.result(timeout=60) for hour, future in impl._loaded_hours.items()}
+    assert threading.main_thread() not in loading_threads
+    for hour, loaded in prefetched.items():
+        expected = load_data_for_time(hour)
+        assert loaded.first_time_index == expected.first_time_index
+        assert np.array_equal(loaded.measurements, expected.measurements)
+
+    data.get_station_measurements(2 * 3600 + 60)
+    assert sorted(impl._loaded_hours) == list(range(2, 3 + impl.PREFETCH_HOURS))
+    assert impl._loaded_hours[2].result(timeout=60) is prefetched[2]  # not loaded again
+
+    data.close()
+    assert not impl._loaded_hours
+    with pytest.raises(RuntimeError):
+        data.get_station_measurements(0)
+
+
+def test_preprocessed_data_in_use_is_not_evicted(processed_data_path, monkeypatch):
+    parameters = InitialValues.simulation_initial_parameters
+    DataProcessor(TEST_DATA_PATHS, deepcopy(parameters))
+    monkeypatch.setattr(InitialValues, "processed_data_max_size", 1)
+    shorter = deepcopy(parameters)
+    shorter.time.max = parameters.time.max - pd.Timedelta(hours=1)
+    in_use = DataProcessor(TEST_DATA_PATHS, shorter)
+
+    assert _entries(processed_data_path) == [in_use._impl._cache_key]
+
+
+def test_measurements_of_data_time_steps_not_dividing_an_hour(processed_data_path):
+    parameters = deepcopy(InitialValues.simulation_initial_parameters)
+    parameters.data_time_step = pd.Timedelta(minutes=45)
+    for mode in PreprocessingMode:
+        data = DataProcessor(TEST_DATA_PATHS, deepcopy(parameters), 1, mode)
+        environment = np.load(next(processed_data_path.iterdir()).joinpath("environment.npy"))
+        # 3700 s is in the second hour, its nearest data time 2700 s is in the first one
+        for time in (0, 2699, 2700, 3700, 5300, 5400, 7 * 3600):
+            measurements = data.get_station_measurements(time)
+            assert np.array_equal(measurements.temperature, environment[time // 2700, ..., 4])
+            assert np.array_equal(measurements.wind, environment[time // 2700, ..., 0:2])
+
+
+def test_columnar_ingestion_matches_row_by_row_conversions(processed_data_path, tmp_path):
+    rows = pd.read_csv(TEST_DATA_PATHS[1])
+    rows.loc[3, "day"] = np.nan
+    rows.loc[5, "min"] = np.nan
+    rows.loc[7, ["year", "hour"]] = np.nan
+    gaps_path = tmp_path.joinpath("gaps.csv")
+    rows.to_csv(gaps_path, index=False)
+    paths = TEST_DATA_PATHS + [gaps_path]
+    data = DataProcessor(TEST_DATA_PATHS, deepcopy(InitialValues.simulation_initial_parameters))
+
+    ingested = data._impl._load_all_data(paths)
+
+    raw = pd.concat([pd.read_csv(csv_path) for csv_path in paths])
+    assert len(ingested) == len(raw)
+    for (_, row), (_, ingested_row) in zip(raw.iterrows(), ingested.iterrows()):
+        date_parts = row[["year", "month", "day", "hour", "min"]]
+        time_stamp = ingested_row[DataAggregationDescriptor.TIME_STAMP.value]
+        if date_parts.isna().any():
+            assert pd.isna(time_stamp)
+        else:
+            assert time_stamp == pd.Timestamp(*[int(part) for part in date_parts])
+        for speed, direction, north, east in (("wind speed", "wind dir", DataAggregationDescriptor.WIND_N,
+                                               DataAggregationDescriptor.WIND_E),
+                                              ("current speed", "current dir", DataAggregationDescriptor.CURRENT_N,
+                                               DataAggregationDescriptor.CURRENT_E)):
+            if pd.isna(row[speed]) or pd.isna(row[direction]):
+                assert pd.isna(ingested_row[north.value]) and pd.isna(ingested_row[east.value])
+            else:
+                expected = SpeedMeasure.from_direction(row[speed], row[direction])
+                assert ingested_row[north.value] == pytest.approx(expected.speed_north, rel=1e-15, abs=1e-15)
+                assert ingested_row[east.value] == pytest.approx(expected.speed_east, rel=1e-15, abs=1e-15)
+    assert ingested[DataAggregationDescriptor.TIME_STAMP.value].isna().sum() == 3
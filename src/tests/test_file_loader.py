@@ -0,0 +1,18 @@
+import numpy as np
+import pytest
+
+from topology.file_loader import _load_binary_from_file, _load_binary_window_from_file
+
+
+@pytest.mark.parametrize("min_x, max_x, min_y, max_y", [(0, 202, 0, 39), (5, 17, 3, 9), (190, 202, 30, 39),
+                                                        (0, 0, 39, 39), (77, 150, 0, 0)])
+def test_window_is_unpacked_like_the_whole_map(tmp_path, min_x, max_x, min_y, max_y):
+    WIDTH, HEIGHT = 203, 40  # rows do not start at byte boundaries
+    map_path = tmp_path.joinpath("map.bin")
+    np.random.default_rng(0).integers(0, 256, -(-WIDTH * HEIGHT // 8), dtype=np.uint8).tofile(map_path)
+
+    window = _load_binary_window_from_file(map_path, WIDTH, min_x, max_x, min_y, max_y)
+
+    whole_map = _load_binary_from_file(map_path)[:WIDTH * HEIGHT].reshape((HEIGHT, WIDTH))
+    assert (window.min_x, window.min_y) == (min_x, min_y)
+    assert np.array_equal(window.bits, whole_map[min_y:max_y + 1, min_x:max_x + 1])
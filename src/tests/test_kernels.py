@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from conftest import sea_slick
+from initial_values import InitialValues
+from simulation import kernels
+from simulation.advection import _advection_transfers
+from simulation.kernels import KernelBackend
+from simulation.seashore import process_seashore_interaction
+from simulation.utilities import Neighbourhood
+from simulation.weathering import process_weathering
+
+
+def _coastal_slick(engine) -> np.ndarray:
+    """Oil on land cells along the coast and on the sea next to them, returns the land slots."""
+    rng = np.random.default_rng(0)
+    ys, xs = np.mgrid[20:60, 95:110]
+    world = engine.world
+    slots = world.slots_of(xs.ravel(), ys.ravel(), create=True)
+    world.oil_mass[slots] = rng.uniform(100, 10000, len(slots))
+    world.viscosity_dynamic[slots] = rng.uniform(0.5, 2, len(slots)) * InitialValues.viscosity_dynamic
+    world.emulsification_rate[slots] = rng.uniform(0, 0.5, len(slots))
+    return slots[world.is_land[slots]]
+
+
+def _masses(world) -> dict[tuple[int, int], float]:
+    slots = world.active_slots()
+    return dict(zip(map(tuple, world.coords[slots].tolist()), world.oil_mass[slots].tolist()))
+
+
+@pytest.mark.parametrize("backend", list(KernelBackend))
+@pytest.mark.parametrize("neighbourhood", [Neighbourhood.MOORE, Neighbourhood.VON_NEUMANN])
+def test_seashore_interaction_matches_point(make_engine, monkeypatch, neighbourhood, backend):
+    monkeypatch.setattr(InitialValues, "neighbourhood", neighbourhood)
+    batched, reference = make_engine(), make_engine()
+    process_seashore_interaction(batched.world, _coastal_slick(batched), backend)
+    for slot in _coastal_slick(reference):
+        reference.world.cell(slot)._process_seashore_interaction()
+
+    batched_masses, reference_masses = _masses(batched.world), _masses(reference.world)
+    assert batched_masses.keys() == reference_masses.keys()
+    assert np.allclose([batched_masses[coord] for coord in reference_masses], list(reference_masses.values()),
+                       rtol=1e-12)
+
+
+def test_weathering_loop_matches_numpy_stage(make_engine):
+    compiled, reference = make_engine(), make_engine()
+    compiled_slots, reference_slots = sea_slick(compiled.world), sea_slick(reference.world)
+
+    assert np.allclose(kernels.process_weathering(compiled.world, compiled_slots),
+                       process_weathering(reference.world, reference_slots), rtol=1e-12)
+    for name in ("oil_mass", "viscosity_dynamic", "emulsification_rate", "evaporation_rate"):
+        assert np.allclose(getattr(compiled.world, name)[compiled_slots],
+                           getattr(reference.world, name)[reference_slots], rtol=1e-12), name
+
+
+@pytest.mark.parametrize("neighbourhood", [Neighbourhood.MOORE, Neighbourhood.VON_NEUMANN])
+def test_advection_loop_matches_numpy_stage(make_engine, monkeypatch, neighbourhood):
+    monkeypatch.setattr(InitialValues, "neighbourhood", neighbourhood)
+    monkeypatch.setattr(InitialValues, "iter_as_sec", 600)  # moves over several cells, so the land check matters
+    compiled, reference = make_engine(), make_engine()
+    compiled_slots, reference_slots = sea_slick(compiled.world), sea_slick(reference.world)
+
+    compiled_transfers = kernels.advection_transfers(compiled.world, compiled_slots)
+    reference_transfers = _advection_transfers(reference.world, reference_slots)
+
+    def by_target(transfers) -> dict[tuple[int, int], np.ndarray]:
+        target_x, target_y, moved, viscosity, emulsification = transfers
+        totals = dict()
+        for x, y, values in zip(target_x.tolist(), target_y.tolist(),
+                                np.column_stack([moved, moved * viscosity, moved * emulsification])):
+            totals[(x, y)] = totals.get((x, y), 0) + values
+        return totals
+
+    compiled_totals, reference_totals = by_target(compiled_transfers), by_target(reference_transfers)
+    assert compiled_totals.keys() == reference_totals.keys()
+    assert np.allclose([compiled_totals[target] for target in reference_totals], list(reference_totals.values()),
+                       rtol=1e-12)
+    assert np.allclose(compiled.world.oil_mass[compiled_slots], reference.world.oil_mass[reference_slots],
+                       rtol=1e-12, atol=1e-9)
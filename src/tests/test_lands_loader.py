@@ -0,0 +1,109 @@
+import numpy as np
+import pytest
+
+from initial_values import InitialValues
+from simulation.utilities import ProjectionMode
+from topology import lands_loader, math
+from topology.binary_map_math import project_binary_map_xy_to_coordinates_raw
+from topology.file_loader import BinaryMapWindow
+from topology.math import get_coordinate_from_xy, get_xy_from_coord_raw
+
+
+@pytest.fixture
+def map_window(grid, monkeypatch) -> BinaryMapWindow:
+    """Random lands over the binary map pixels of the simulation area."""
+    corners = [get_coordinate_from_xy(x, y) for x, y in ((0, 0), (InitialValues.point_side_lon_count, 0),
+                                                         (0, InitialValues.point_side_lat_count),
+                                                         (InitialValues.point_side_lon_count,
+                                                          InitialValues.point_side_lat_count))]
+    monkeypatch.setattr(InitialValues, "min_lat", min(corner.latitude for corner in corners))
+    monkeypatch.setattr(InitialValues, "max_lat", max(corner.latitude for corner in corners))
+    monkeypatch.setattr(InitialValues, "min_lon", min(corner.longitude for corner in corners))
+    monkeypatch.setattr(InitialValues, "max_lon", max(corner.longitude for corner in corners))
+    min_x, max_x, min_y, max_y = lands_loader._get_map_window()
+    bits = (np.random.default_rng(0).random((max_y - min_y + 1, max_x - min_x + 1)) < 0.9).astype(np.uint8)
+    return BinaryMapWindow(bits, min_x, min_y)
+
+
+def _reference_land_mask(lands: list[tuple[int, int]]) -> np.ndarray:
+    """Per-pixel rasterization of the lands, as it was done before it worked on arrays."""
+    land_mask = np.zeros((InitialValues.point_side_lat_count, InitialValues.point_side_lon_count), dtype=np.uint8)
+    for x, y in lands:
+        corners = [get_xy_from_coord_raw(*project_binary_map_xy_to_coordinates_raw(corner_x, corner_y))
+                   for corner_x, corner_y in ((x, y), (x + 1, y + 1), (x + 1, y), (x, y + 1))]
+        min_x = max(min(corner[0] for corner in corners), 0)
+        max_x = min(max(corner[0] for corner in corners), InitialValues.point_side_lon_count)
+        min_y = max(min(corner[1] for corner in corners), 0)
+        max_y = min(max(corner[1] for corner in corners), InitialValues.point_side_lat_count)
+        land_mask[min_y:max(min_y, max_y), min_x:max(min_x, max_x)] = 1
+    return land_mask
+
+
+def test_rasterized_lands_match_per_pixel_rasterization(map_window):
+    ys, xs = np.nonzero(map_window.bits == 0)
+    xs, ys = xs + map_window.min_x, ys + map_window.min_y
+
+    land_mask = lands_loader._map_binary_lands(xs, ys)
+
+    assert 0 < land_mask.sum() < land_mask.size
+    assert np.array_equal(land_mask, _reference_land_mask(list(zip(xs.tolist(), ys.tolist()))))
+
+
+def test_lands_are_land_pixels_of_the_window(map_window):
+    xs, ys = lands_loader._get_lands(map_window)
+
+    height, width = map_window.bits.shape
+    expected = {(map_window.min_x + x, map_window.min_y + y) for y in range(height) for x in range(width)
+                if map_window.bits[y, x] == 0}
+    assert len(xs) == len(expected)
+    assert set(zip(xs.tolist(), ys.tolist())) == expected
+
+
+@pytest.fixture
+def windows_read(map_window, tmp_path, monkeypatch) -> list[tuple[int, int, int, int]]:
+    """Topography is cached in tmp_path and read from map_window, returns the windows read from the map."""
+    windows_read = []
+
+    def get_binary_map_window(*window):
+        windows_read.append(window)
+        return map_window
+
+    monkeypatch.setattr(lands_loader, "get_topography_cache_dir_path", lambda: tmp_path)
+    monkeypatch.setattr(lands_loader, "get_binary_world_map_stamp", lambda: ("map.bin", 1, 2))
+    monkeypatch.setattr(lands_loader, "get_binary_map_window", get_binary_map_window)
+    return windows_read
+
+
+def test_land_mask_is_cached_per_grid(windows_read, tmp_path, monkeypatch):
+    land_mask = lands_loader.load_topography()
+    cached = lands_loader.load_topography()
+    assert len(windows_read) == 1
+    assert isinstance(cached, np.memmap) and np.array_equal(cached, land_mask)
+
+    monkeypatch.setattr(lands_loader, "get_binary_world_map_stamp", lambda: ("map.bin", 1, 3))
+    lands_loader.load_topography()
+    monkeypatch.setattr(InitialValues, "point_side_lat_count", InitialValues.point_side_lat_count - 10)
+    assert lands_loader.load_topography().shape == (InitialValues.point_side_lat_count,
+                                                    InitialValues.point_side_lon_count)
+    assert len(windows_read) == 3
+    assert len(list(tmp_path.glob("topography_*.npy"))) == 3
+
+    lands_loader._get_topography_cache_path().write_bytes(b"not a mask")
+    assert lands_loader.load_topography().shape == (InitialValues.point_side_lat_count,
+                                                    InitialValues.point_side_lon_count)
+    assert len(windows_read) == 4
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_land_mask_is_cached_per_projection(windows_read, tmp_path, monkeypatch):
+    monkeypatch.setattr(math, "_local_projection", None)
+    geodesic = lands_loader.load_topography()
+    assert math.set_projection_mode(ProjectionMode.LOCAL) == ProjectionMode.LOCAL
+    local = lands_loader.load_topography()
+
+    assert len(windows_read) == 2
+    assert len(list(tmp_path.glob("topography_*.npy"))) == 2
+    assert np.array_equal(lands_loader.load_topography(), local)
+    math.set_projection_mode(ProjectionMode.GEODESIC)
+    assert np.array_equal(lands_loader.load_topography(), geodesic)
+    assert len(windows_read) == 2
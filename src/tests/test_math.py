@@ -0,0 +1,84 @@
+import logging
+
+import numpy as np
+import pytest
+
+from data.measurement_data import Coordinates
+from initial_values import InitialValues
+from simulation.utilities import ProjectionMode
+from topology import math
+
+
+@pytest.fixture
+def projection(grid, monkeypatch):
+    """Restores the projection mode after the test."""
+    monkeypatch.setattr(math, "_local_projection", None)
+
+
+def _coordinates(xs: np.ndarray, ys: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    coordinates = [math.get_coordinate_from_xy(x, y) for x, y in zip(xs.tolist(), ys.tolist())]
+    return np.array([coordinate.longitude for coordinate in coordinates]), \
+        np.array([coordinate.latitude for coordinate in coordinates])
+
+
+def test_local_projection_is_within_its_reported_error(projection, caplog):
+    ys, xs = np.mgrid[0:InitialValues.point_side_lat_count + 1:7, 0:InitialValues.point_side_lon_count + 1:7]
+    geodesic_lons, geodesic_lats = _coordinates(xs.ravel(), ys.ravel())
+
+    with caplog.at_level(logging.INFO, logger="topology"):
+        assert math.set_projection_mode(ProjectionMode.LOCAL) == ProjectionMode.LOCAL
+    error = math._local_projection.max_error()
+    assert f"max error {error:.3f} m" in caplog.text
+    assert error <= InitialValues.projection_max_error * InitialValues.point_side_size
+
+    local_lons, local_lats = _coordinates(xs.ravel(), ys.ravel())
+    _, _, distances = math._geodesic.inv(local_lons, local_lats, geodesic_lons, geodesic_lats)
+    assert distances.max() <= error
+    lats, lons = math.get_coordinates_from_xy_many(xs.ravel(), ys.ravel(), cached=False)
+    assert np.array_equal(lons, local_lons) and np.array_equal(lats, local_lats)
+
+
+def test_local_projection_is_refused_above_the_allowed_error(projection, monkeypatch, caplog):
+    monkeypatch.setattr(InitialValues, "point_side_size", 5000)
+    monkeypatch.setattr(InitialValues, "point_side_lon_count", 2000)
+    monkeypatch.setattr(InitialValues, "point_side_lat_count", 2000)
+    monkeypatch.setattr(InitialValues, "top_left_coord", Coordinates(latitude=60.0, longitude=-89.0))
+
+    with caplog.at_level(logging.WARNING, logger="topology"):
+        assert math.set_projection_mode(ProjectionMode.LOCAL) == ProjectionMode.GEODESIC
+    assert "using geodesic conversions" in caplog.text
+    assert math._active_projection() is None
+
+
+def test_points_outside_of_the_fitted_area_are_geodesic(projection, monkeypatch):
+    monkeypatch.setattr(InitialValues, "point_side_size", 50)
+    xs = np.array([-100, 400, InitialValues.point_side_lon_count + 50, 3, -2])
+    ys = np.array([-100, 320, 5, InitialValues.point_side_lat_count + 80, 1])
+    geodesic_lons, geodesic_lats = _coordinates(xs, ys)
+    geodesic_lats_many, geodesic_lons_many = math.get_coordinates_from_xy_many(xs, ys, cached=False)
+
+    assert math.set_projection_mode(ProjectionMode.LOCAL) == ProjectionMode.LOCAL
+    local_lons, local_lats = _coordinates(xs, ys)
+    lats, lons = math.get_coordinates_from_xy_many(xs, ys, cached=False)
+
+    outside = np.array([True, True, True, True, False])
+    assert np.array_equal(local_lons[outside], geodesic_lons[outside])
+    assert np.array_equal(local_lats[outside], geodesic_lats[outside])
+    assert np.array_equal(lons[outside], geodesic_lons_many[outside])
+    assert np.array_equal(lats[outside], geodesic_lats_many[outside])
+    _, _, error = math._geodesic.inv(lons, lats, geodesic_lons_many, geodesic_lats_many)
+    assert error.max() <= InitialValues.projection_max_error * InitialValues.point_side_size
+
+
+def test_coordinate_blocks_match_coordinates_of_every_cell(projection):
+    edges = [-65, -64, -2, -1, 0, 1, 62, 63, 64, 65, 98, 99, 100, 101, 119, 120, 127, 128, 129]
+    ys, xs = np.array(np.meshgrid(edges, edges, indexing="ij")).reshape(2, -1)
+    expected_lons, expected_lats = _coordinates(xs, ys)
+
+    lats, lons = math.get_coordinates_from_xy_many(xs, ys)
+    cached = [math.get_coordinate_from_xy_cached((x, y)) for x, y in zip(xs.tolist(), ys.tolist())]
+
+    assert np.allclose(lats, expected_lats, rtol=0, atol=1e-9)
+    assert np.allclose(lons, expected_lons, rtol=0, atol=1e-9)
+    assert np.allclose([coordinate.latitude for coordinate in cached], expected_lats, rtol=0, atol=1e-9)
+    assert np.allclose([coordinate.longitude for coordinate in cached], expected_lons, rtol=0, atol=1e-9)
@@ -0,0 +1,99 @@
+from copy import deepcopy
+from dataclasses import replace
+
+import numpy as np
+import pandas as pd
+
+from conftest import TEST_DATA_PATHS, FakeDataProcessor
+from data.data_processor import DataProcessor, StationMeasurements
+from initial_values import InitialValues
+from simulation import advection, simulation, spreading
+
+
+def test_resumed_run_reads_weather_of_its_simulation_time(make_engine, processed_data_path, monkeypatch):
+    HOUR = 3600
+    parameters = InitialValues.simulation_initial_parameters
+    full_run_data = DataProcessor(TEST_DATA_PATHS, deepcopy(parameters))
+    # like a run resumed from a checkpoint, data is preprocessed from the checkpoint on
+    resumed_parameters = deepcopy(parameters)
+    resumed_parameters.time.min = parameters.time.min + pd.Timedelta(hours=12)
+    resumed_run_data = DataProcessor(TEST_DATA_PATHS, resumed_parameters)
+    monkeypatch.setattr(InitialValues, "total_simulation_time", 12 * HOUR + 600)
+
+    engine = make_engine(resumed_run_data)
+    engine.world.add((50, 50)).add_oil(1e6)
+    engine.update()
+
+    slot = engine.world.slot_of((50, 50))
+    station_lat, station_lon = engine.world.station[slot]
+    expected = full_run_data.get_station_measurements(12 * HOUR + 600)
+    assert np.allclose(engine.world.wind_velocity[slot], expected.wind[station_lat, station_lon])
+    assert np.allclose(engine.world.wave_velocity[slot], expected.current[station_lat, station_lon])
+    assert engine.world.temperature[slot] == expected.temperature[station_lat, station_lon]
+
+
+class _ChangingWeatherDataProcessor(FakeDataProcessor):
+    """Temperature rising by a degree every data time step, records the times its measurements were read at."""
+
+    def __init__(self):
+        self.read_times = []
+
+    def get_station_measurements(self, time: int) -> StationMeasurements:
+        self.read_times.append(time)
+        measurements = super().get_station_measurements(time)
+        return replace(measurements, temperature=measurements.temperature + time // self.data_time_step)
+
+
+def test_weather_of_all_cells_is_refreshed_once_per_data_time_step(make_engine, monkeypatch):
+    monkeypatch.setattr(InitialValues, "iter_as_sec", 600)
+    data = _ChangingWeatherDataProcessor()
+    engine = make_engine(data)
+    world = engine.world
+    world.add((40, 30)).add_oil(1e8)
+
+    def weather(coord):
+        slot = world.slot_of(coord)
+        station_lat, station_lon = world.station[slot]
+        return world.last_weather_update[slot], world.temperature[slot] - 290.0 - station_lat
+
+    engine.update()  # 0 s
+    assert data.read_times == [0]
+    assert weather((40, 30)) == (0, 0)
+
+    world.add((70, 60)).add_oil(1e8)
+    engine.update()  # 600 s, only the new cell gets weather
+    engine.update()  # 1200 s
+    assert data.read_times == [0]
+    assert weather((40, 30)) == (0, 0)
+    assert weather((70, 60)) == (600, 0)
+
+    engine.update()  # 1800 s, the next data time step refreshes all cells
+    assert data.read_times == [0, 1800]
+    assert weather((40, 30)) == (1800, 1)
+    assert weather((70, 60)) == (1800, 1)
+
+
+def _run_spill(engine, steps: int) -> dict[str, np.ndarray]:
+    for x, y in ((40, 30), (41, 30), (70, 60)):
+        engine.world.add((x, y)).add_oil(5e8)
+    for _ in range(steps):
+        engine.update()
+    world = engine.world
+    slots = world.active_slots()
+    order = np.lexsort((world.coords[slots, 0], world.coords[slots, 1]))
+    slots = slots[order]
+    return {name: getattr(world, name)[slots].copy() for name in ("coords", "oil_mass", "viscosity_dynamic",
+                                                                  "emulsification_rate", "evaporation_rate")}
+
+
+def test_executors_give_identical_results(make_engine, monkeypatch):
+    # small chunks, so every stage runs as several tasks
+    monkeypatch.setattr(simulation, "SLOT_CHUNK_SIZE", 300)
+    monkeypatch.setattr(advection, "SLOT_CHUNK_SIZE", 300)
+    monkeypatch.setattr(spreading, "STENCIL_CHUNK_TILES", 1)
+    serial = _run_spill(make_engine(), 40)
+    assert len(serial["oil_mass"]) > 1000
+    for kwargs in (dict(workers=3), dict(processes=2)):
+        parallel = _run_spill(make_engine(**kwargs), 40)
+        for name, values in serial.items():
+            assert np.array_equal(parallel[name], values), name
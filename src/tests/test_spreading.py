@@ -0,0 +1,23 @@
+import numpy as np
+import pytest
+
+from simulation.spreading import SpreadingEngine, SpreadingMode
+
+
+@pytest.mark.parametrize("mode", list(SpreadingMode))
+def test_spreading_conserves_mass(make_engine, mode):
+    engine = make_engine()
+    world = engine.world
+    rng = np.random.default_rng(0)
+    # across the corner of four tiles, far from the edges of the simulation area
+    ys, xs = np.mgrid[58:70, 56:72]
+    for x, y, mass in zip(xs.ravel().tolist(), ys.ravel().tolist(), rng.uniform(1e5, 1e7, xs.size).tolist()):
+        world.add((x, y)).add_oil(mass)
+    total_mass = world.oil_mass[world.active_slots()].sum()
+
+    spreading_engine = SpreadingEngine(engine, mode)
+    for _ in range(5):
+        spreading_engine.spread_oil_points(total_mass)
+
+    assert len(world) > xs.size
+    assert world.oil_mass[world.active_slots()].sum() == pytest.approx(total_mass, rel=1e-12)
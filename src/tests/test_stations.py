@@ -0,0 +1,25 @@
+from copy import deepcopy
+
+import numpy as np
+import pytest
+
+from conftest import TEST_DATA_PATHS
+from data.data_processor import DataProcessor
+from initial_values import InitialValues
+from simulation.stations import WeatherStationGrid
+from topology.math import get_coordinate_from_xy
+
+
+@pytest.mark.parametrize("point_side_size", [500, 2000, 5000])
+def test_station_grid_matches_nearest_station_of_every_cell(grid, processed_data_path, monkeypatch, point_side_size):
+    monkeypatch.setattr(InitialValues, "point_side_size", point_side_size)
+    data = DataProcessor(TEST_DATA_PATHS, deepcopy(InitialValues.simulation_initial_parameters))
+    ys, xs = np.indices((InitialValues.point_side_lat_count, InitialValues.point_side_lon_count))
+    xs, ys = xs.ravel(), ys.ravel()
+
+    stations = WeatherStationGrid(data).stations(xs, ys)
+
+    expected = [data.weather_station_coordinates(get_coordinate_from_xy(x, y))
+                for x, y in zip(xs.tolist(), ys.tolist())]
+    assert len(np.unique(stations, axis=0)) > 1
+    assert stations.tolist() == [[station.latitude, station.longitude] for station in expected]
@@ -0,0 +1,24 @@
+import numpy as np
+
+from conftest import sea_slick
+from simulation.weathering import process_weathering
+
+
+def test_weathering_matches_point(make_engine):
+    batched, reference = make_engine(), make_engine()
+    batched_slots, reference_slots = sea_slick(batched.world), sea_slick(reference.world)
+
+    evaporated, dispersed = process_weathering(batched.world, batched_slots)
+    reference_evaporated = reference_dispersed = 0
+    for slot in reference_slots.tolist():
+        cell = reference.world.cell(slot)
+        delta_y = cell._process_emulsification()
+        delta_f, evaporated_mass = cell._process_evaporation()
+        reference_dispersed += cell._process_natural_dispersion()
+        cell._viscosity_change(delta_f, delta_y)
+        reference_evaporated += evaporated_mass
+
+    assert np.allclose([evaporated, dispersed], [reference_evaporated, reference_dispersed], rtol=1e-9, atol=0)
+    for name in ("oil_mass", "viscosity_dynamic", "emulsification_rate", "evaporation_rate"):
+        assert np.allclose(getattr(batched.world, name)[batched_slots], getattr(reference.world, name)[reference_slots],
+                           rtol=1e-9, atol=0), name
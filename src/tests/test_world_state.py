@@ -0,0 +1,42 @@
+import numpy as np
+
+from initial_values import InitialValues
+from simulation.world_state import WorldState
+
+
+def test_slot_of_matches_slots_of(make_engine):
+    world = make_engine().world
+    rng = np.random.default_rng(0)
+    world.slots_of(rng.integers(0, 80, 300), rng.integers(0, 60, 300), create=True)
+    world.remove(world.active_slots()[::3])
+    xs = rng.integers(-5, InitialValues.point_side_lon_count + 5, 2000)
+    ys = rng.integers(-5, InitialValues.point_side_lat_count + 5, 2000)
+
+    expected = [None if slot < 0 else slot for slot in world.slots_of(xs, ys).tolist()]
+    assert [world.slot_of((x, y)) for x, y in zip(xs.tolist(), ys.tolist())] == expected
+    assert [(x, y) in world for x, y in zip(xs.tolist(), ys.tolist())] == [slot is not None for slot in expected]
+
+
+def test_released_tiles_shrink_the_arrays(make_engine, monkeypatch):
+    monkeypatch.setattr(InitialValues, "point_side_lon_count", 16 * WorldState.TILE_SIZE)
+    monkeypatch.setattr(InitialValues, "point_side_lat_count", 8 * WorldState.TILE_SIZE)
+    world = make_engine(land_mask=np.zeros((InitialValues.point_side_lat_count, InitialValues.point_side_lon_count),
+                                           np.uint8)).world
+    tile_ys, tile_xs = np.divmod(np.arange(128), 16)
+    world.slots_of(tile_xs * WorldState.TILE_SIZE + 5, tile_ys * WorldState.TILE_SIZE + 7, create=True)
+    world.oil_mass[world.active_slots()] = np.arange(128)
+    assert world.tile_capacity == 128
+
+    kept = [(5 + WorldState.TILE_SIZE * 3, 7 + WorldState.TILE_SIZE * 2), (5 + WorldState.TILE_SIZE * 9, 7)]
+    kept_mass = [world[coord].oil_mass for coord in kept]
+    world.set_oil_buffer(world.slot_of(kept[0]), [(1.0, 2.0, 0.5)])
+    world.remove(np.array([slot for slot in world.active_slots() if tuple(world.coords[slot]) not in kept]))
+    world.release_empty_tiles()
+
+    assert world.tile_capacity <= 4 * len(kept) < 128
+    assert len(world) == len(kept)
+    assert [world[coord].oil_mass for coord in kept] == kept_mass
+    assert world[kept[0]].oil_buffer == [(1.0, 2.0, 0.5)]
+    world.slots_of(np.arange(0, 16 * WorldState.TILE_SIZE, 32), np.full(32, 300), create=True)
+    assert len(world) == len(kept) + 32
+    assert [world[coord].oil_mass for coord in kept] == kept_mass
@@ -1,3 +1,5 @@
+import numpy as np
+
 from data.measurement_data import Coordinates, CoordinatesBase
 from initial_values import InitialValues
 
@@ -40,6 +42,9 @@ def project_binary_map_xy_to_coordinates(x: int, y: int) -> Coordinates:
 def project_binary_map_xy_to_coordinates_raw(x: int, y: int) -> tuple[float, float]:
     return _project_to_coordinates_raw(x, y, InitialValues.BINARY_MAP_WIDTH, InitialValues.BINARY_MAP_HEIGHT)
 
+def project_binary_map_xy_to_coordinates_many(xs: np.ndarray, ys: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    return _project_to_coordinates_raw(xs, ys, InitialValues.BINARY_MAP_WIDTH, InitialValues.BINARY_MAP_HEIGHT)
+
 def project_longitude_to_x(lon: float) -> int:
     return _project_longitude_to_x(lon, InitialValues.BINARY_MAP_WIDTH)
 
@@ -1,3 +1,4 @@
+from dataclasses import dataclass
 from logging import getLogger
 from os import PathLike, path
 from zipfile import ZipFile
@@ -12,6 +13,13 @@ from initial_values import InitialValues
 BinaryMap = npt.ArrayLike
 
 
+@dataclass
+class BinaryMapWindow:
+    bits: np.ndarray  # (y, x) pixels of the window, 0 for land
+    min_x: int
+    min_y: int
+
+
 logger = getLogger("topology")
 
 
@@ -20,6 +28,18 @@ def _load_binary_from_file(path_to_world_map: PathLike) -> BinaryMap:
     return np.unpackbits(map_bytes)
 
 
+def _load_binary_window_from_file(path_to_world_map: PathLike, width: int, min_x: int, max_x: int, min_y: int,
+                                  max_y: int) -> BinaryMapWindow:
+    """Unpacks only the bytes of the memory-mapped packed map which cover pixels [min_x, max_x] x [min_y, max_y]."""
+    map_bytes = np.memmap(path_to_world_map, dtype=np.uint8, mode="r")
+    row_first_bits = np.arange(min_y, max_y + 1, dtype=np.int64) * width + min_x
+    row_bytes = (max_x - min_x + 1 + 7) // 8 + 1
+    byte_indices = np.minimum(row_first_bits[:, None] // 8 + np.arange(row_bytes), len(map_bytes) - 1)
+    bits = np.unpackbits(map_bytes[byte_indices], axis=1)
+    columns = row_first_bits[:, None] % 8 + np.arange(max_x - min_x + 1)
+    return BinaryMapWindow(np.take_along_axis(bits, columns, axis=1), min_x, min_y)
+
+
 def _unzip_world_map():
     logger.info("Unzipping world map")
     output_dir = get_unzipped_world_map_dir_path()
@@ -34,14 +54,26 @@ def _unzip_world_map():
     logger.info("World map has been unzipped successfully and saved to %s", output_dir)
 
 
-def _get_unzipped_world_map(path: PathLike) -> BinaryMap:
+def _get_unzipped_world_map_path(path: PathLike) -> PathLike:
     if not path.exists():
         _unzip_world_map()
-    return _load_binary_from_file(path)
+    return path
+
+
+def _get_unzipped_world_map(path: PathLike) -> BinaryMap:
+    return _load_binary_from_file(_get_unzipped_world_map_path(path))
+
+
+def get_binary_map_window(min_x: int, max_x: int, min_y: int, max_y: int) -> BinaryMapWindow:
+    return _load_binary_window_from_file(_get_unzipped_world_map_path(get_binary_world_map_path()),
+                                         InitialValues.BINARY_MAP_WIDTH, min_x, max_x, min_y, max_y)
 
 
-def get_binary_map() -> BinaryMap:
-    return _get_unzipped_world_map(get_binary_world_map_path())
+def get_binary_world_map_stamp() -> tuple[str, int, int]:
+    """Returns name, size and modification time of the world map, they change whenever the map file is replaced."""
+    map_path = _get_unzipped_world_map_path(get_binary_world_map_path())
+    stat = map_path.stat()
+    return map_path.name, stat.st_size, stat.st_mtime_ns
 
 
 def get_binary_scaled_map() -> BinaryMap:
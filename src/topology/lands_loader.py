@@ -1,25 +1,22 @@
-from itertools import product
+import hashlib
+import os
 from logging import getLogger
-from typing import Any
+from pathlib import Path
 
 import numpy as np
 
+from files import get_topography_cache_dir_path
 from initial_values import InitialValues
-from simulation.point import Coord_t
-from topology.binary_map_math import project_binary_map_xy_to_coordinates_raw, project_latitude_to_y, \
+from topology.binary_map_math import project_binary_map_xy_to_coordinates_many, project_latitude_to_y, \
     project_longitude_to_x
-from topology.file_loader import BinaryMap, get_binary_map
-from topology.math import get_xy_from_coord_raw
+from topology.file_loader import BinaryMapWindow, get_binary_map_window, get_binary_world_map_stamp
+from topology.math import get_projection_mode, get_xy_from_coord_raw_many
 
 logger = getLogger("topology")
 
 
-def _is_land(binary_map: BinaryMap, x: int, y: int) -> bool:
-    index = (y * InitialValues.BINARY_MAP_WIDTH) + x
-    return binary_map[index] == 0
-
-
-def _get_map_range() -> product:
+def _get_map_window() -> tuple[int, int, int, int]:
+    """Returns min_x, max_x, min_y, max_y of the binary map pixels covering the simulation area, inclusive."""
     ADDITIONAL_RANGE = 1
     max_x = project_longitude_to_x(InitialValues.max_lon)
     min_x = project_longitude_to_x(InitialValues.min_lon)
@@ -29,77 +26,107 @@ def _get_map_range() -> product:
     max_y = min(max_y + ADDITIONAL_RANGE, InitialValues.BINARY_MAP_HEIGHT)
     min_y = max(min_y - ADDITIONAL_RANGE, 0)
     min_x = max(min_x - ADDITIONAL_RANGE, 0)
-    return product(range(min_x, max_x + 1), range(min_y, max_y + 1))
-
-
-def _get_lands_set(binary_map: BinaryMap) -> set[tuple[Any, Any]]:
-    logger.debug("STARTED: Loading lands set")
-    lands = set()
+    return min_x, max_x, min_y, max_y
 
-    for x, y in _get_map_range():
-        if _is_land(binary_map, x, y):
-            lands.add((x, y))
 
-    logger.debug("FINISHED: Loading lands set")
-    return lands
+def _get_lands(binary_map: BinaryMapWindow) -> tuple[np.ndarray, np.ndarray]:
+    """Returns x and y of the land pixels of a binary map window."""
+    logger.debug("STARTED: Loading lands")
+    ys, xs = np.nonzero(binary_map.bits == 0)
+    logger.debug("FINISHED: Loading lands")
+    return xs + binary_map.min_x, ys + binary_map.min_y
 
 
-def _map_binary_lands(binary_lands: set[Coord_t]) -> tuple[set[tuple[int, int]], np.ndarray, np.ndarray]:
+def _map_binary_lands(xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+    """
+    Rasterizes land pixels of the binary map into the land mask of the simulation grid. Every pixel marks the cells
+    of the bounding box of its four corners projected onto the grid.
+    """
     logger.debug("STARTED: Mapping binary lands")
 
-    xy_points = dict()
-
-    def get_point_xy(lon: float, lat: float) -> tuple[int, int]:
-        if (lon, lat) not in xy_points:
-            xy_points[(lon, lat)] = get_xy_from_coord_raw(lon, lat)
-        return xy_points[(lon, lat)]
-
-    projected_to_coords = dict()
-
-    def get_projected_to_coords(x: int, y: int) -> tuple[float, float]:
-        if (x, y) not in projected_to_coords:
-            projected_to_coords[(x, y)] = project_binary_map_xy_to_coordinates_raw(x, y)
-        return projected_to_coords[(x, y)]
-
-    result = set()
-    x_indices = []
-    y_indices = []
-
-    for x, y in binary_lands:
-        vertex_top_left = get_projected_to_coords(x, y)
-        vertex_bottom_right = get_projected_to_coords(x + 1, y + 1)
-        vertex_top_right = get_projected_to_coords(x + 1, y)
-        vertex_bottom_left = get_projected_to_coords(x, y + 1)
-
-        vertex_top_left_x, vertex_top_left_y = get_point_xy(vertex_top_left[0], vertex_top_left[1])
-        vertex_bottom_right_x, vertex_bottom_right_y = get_point_xy(vertex_bottom_right[0], vertex_bottom_right[1])
-        vertex_top_right_x, vertex_top_right_y = get_point_xy(vertex_top_right[0], vertex_top_right[1])
-        vertex_bottom_left_x, vertex_bottom_left_y = get_point_xy(vertex_bottom_left[0], vertex_bottom_left[1])
-
-        max_y = max(vertex_top_left_y, vertex_bottom_right_y, vertex_top_right_y, vertex_bottom_left_y)
-        min_y = min(vertex_top_left_y, vertex_bottom_right_y, vertex_top_right_y, vertex_bottom_left_y)
-        max_x = max(vertex_top_left_x, vertex_bottom_right_x, vertex_top_right_x, vertex_bottom_left_x)
-        min_x = min(vertex_top_left_x, vertex_bottom_right_x, vertex_top_right_x, vertex_bottom_left_x)
-
-        max_y = min(max_y, InitialValues.point_side_lat_count)
-        max_x = min(max_x, InitialValues.point_side_lon_count)
-        min_x = max(min_x, 0)
-        min_y = max(min_y, 0)
-
-        for x in range(min_x, max_x):
-            for y in range(min_y, max_y):
-                result.add((x, y))
-                x_indices.append(x)
-                y_indices.append(y)
-
-    x_indices = np.array(x_indices, dtype=int)
-    y_indices = np.array(y_indices, dtype=int)
+    land_mask = np.zeros((InitialValues.point_side_lat_count, InitialValues.point_side_lon_count), dtype=np.uint8)
+    if len(xs) == 0:
+        return land_mask
+
+    # grid coordinates of the corners of all pixels in the bounding window of the lands, one geodesic call
+    corner_ys, corner_xs = np.mgrid[ys.min():ys.max() + 2, xs.min():xs.max() + 2]
+    lons, lats = project_binary_map_xy_to_coordinates_many(corner_xs.ravel(), corner_ys.ravel())
+    grid_x, grid_y = get_xy_from_coord_raw_many(lons, lats)
+    grid_x, grid_y = grid_x.reshape(corner_xs.shape), grid_y.reshape(corner_ys.shape)
+
+    rows, columns = ys - ys.min(), xs - xs.min()
+    corners = [(rows, columns), (rows + 1, columns + 1), (rows, columns + 1), (rows + 1, columns)]
+    corner_x = np.stack([grid_x[corner] for corner in corners])
+    corner_y = np.stack([grid_y[corner] for corner in corners])
+    min_x = np.maximum(corner_x.min(axis=0), 0)
+    max_x = np.minimum(corner_x.max(axis=0), InitialValues.point_side_lon_count)
+    min_y = np.maximum(corner_y.min(axis=0), 0)
+    max_y = np.minimum(corner_y.max(axis=0), InitialValues.point_side_lat_count)
+
+    # boxes [min, max) summed up as a 2-D difference array
+    inside = (min_x < max_x) & (min_y < max_y)
+    min_x, max_x, min_y, max_y = min_x[inside], max_x[inside], min_y[inside], max_y[inside]
+    coverage = np.zeros((land_mask.shape[0] + 1, land_mask.shape[1] + 1), dtype=np.int32)
+    np.add.at(coverage, (min_y, min_x), 1)
+    np.add.at(coverage, (min_y, max_x), -1)
+    np.add.at(coverage, (max_y, min_x), -1)
+    np.add.at(coverage, (max_y, max_x), 1)
+    land_mask[:] = coverage.cumsum(axis=0).cumsum(axis=1)[:-1, :-1] > 0
 
     logger.debug("FINISHED: Mapping binary lands")
 
-    return result, x_indices, y_indices
-
-
-def load_topography() -> tuple[set[tuple[Any, Any]], np.ndarray, np.ndarray]:
-    binary_lands = _get_lands_set(get_binary_map())
-    return _map_binary_lands(binary_lands)
+    return land_mask
+
+
+def is_land_at(land_mask: np.ndarray, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+    """Looks up cells in a land mask, cells out of the simulation area are sea."""
+    inside = (0 <= xs) & (xs < land_mask.shape[1]) & (0 <= ys) & (ys < land_mask.shape[0])
+    is_land = np.zeros(len(xs), dtype=bool)
+    is_land[inside] = land_mask[ys[inside], xs[inside]] != 0
+    return is_land
+
+
+def _get_topography_cache_path() -> Path:
+    """
+    Path of the cached land mask, named after a hash of the simulation grid, the projection used to rasterize it and the
+    world map file.
+    """
+    CACHE_VERSION = 1  # bump when the rasterization changes
+    key = (CACHE_VERSION, InitialValues.top_left_coord.latitude, InitialValues.top_left_coord.longitude,
+           InitialValues.min_lat, InitialValues.max_lat, InitialValues.min_lon, InitialValues.max_lon,
+           InitialValues.point_side_size, InitialValues.point_side_lat_count, InitialValues.point_side_lon_count,
+           InitialValues.BINARY_MAP_WIDTH, InitialValues.BINARY_MAP_HEIGHT, get_binary_world_map_stamp(),
+           get_projection_mode().name)
+    digest = hashlib.sha256(repr(key).encode()).hexdigest()[:32]
+    return get_topography_cache_dir_path().joinpath(f"topography_{digest}.npy")
+
+
+def _save_topography_cache(cache_path: Path, land_mask: np.ndarray):
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = cache_path.with_name(f"{cache_path.stem}.{os.getpid()}.tmp")
+        with open(temporary_path, "wb") as file:
+            np.save(file, land_mask)
+        os.replace(temporary_path, cache_path)  # readers never see a partially written file
+    except OSError as error:
+        logger.warning("Could not save topography cache %s: %s", cache_path, error)
+
+
+def load_topography() -> np.ndarray:
+    """
+    Returns dense (y, x) uint8 mask of the simulation area, 1 for land. The mask is cached on disk, repeated runs over
+    the same area get it memory-mapped read-only.
+    """
+    cache_path = _get_topography_cache_path()
+    if cache_path.exists():
+        try:
+            land_mask = np.load(cache_path, mmap_mode="r")
+            if land_mask.shape == (InitialValues.point_side_lat_count, InitialValues.point_side_lon_count):
+                logger.debug("Topography loaded from cache %s", cache_path)
+                return land_mask
+        except (OSError, ValueError) as error:
+            logger.warning("Could not load topography cache %s: %s", cache_path, error)
+
+    land_mask = _map_binary_lands(*_get_lands(get_binary_map_window(*_get_map_window())))
+    _save_topography_cache(cache_path, land_mask)
+    return land_mask
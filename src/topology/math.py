@@ -1,11 +1,17 @@
 from enum import Enum
+from logging import getLogger
 from math import atan2, cos, sin, degrees, radians, sqrt
+from typing import Optional
 
 import geopy.distance as geo
+import numpy as np
 import pyproj as proj
 
 from data.measurement_data import Coordinates
 from initial_values import InitialValues
+from simulation.utilities import ProjectionMode
+
+logger = getLogger("topology")
 
 
 class MoveDirection(Enum):
@@ -35,6 +41,11 @@ def move_coordinate_raw(lat: float, lon: float, distance: float, direction: Move
 
 
 def get_coordinate_from_xy(x: int, y: int) -> Coordinates:
+    projection = _active_projection()
+    x_metres, y_metres = float(x * InitialValues.point_side_size), float(y * InitialValues.point_side_size)
+    if projection is not None and projection.covers_metres(x_metres, y_metres):
+        lon, lat = projection.to_coordinates(x_metres, y_metres)
+        return Coordinates(latitude=lat, longitude=lon)
     degree_bearing = (180.0 + degrees(atan2(-x, y))) % 360 if x != 0 or y != 0 else 0
     x_distance = abs(x) * InitialValues.point_side_size
     y_distance = abs(y) * InitialValues.point_side_size
@@ -46,6 +57,10 @@ BEARING_OFFSET = 90.0
 
 
 def get_xy_dist_from_coord(first: Coordinates, second: Coordinates) -> tuple[int, int]:
+    projection = _active_projection()
+    if projection is not None and first == InitialValues.top_left_coord and projection.covers(second):
+        x, y = projection.to_metres(float(second.longitude), float(second.latitude))
+        return int(x), int(y)
     bearing, distance = calculate_compass_bearing_and_dist(first, second)
     rad = radians(bearing - BEARING_OFFSET)
     x = int(distance * cos(rad))
@@ -60,6 +75,18 @@ def get_xy_from_coord_raw(lon: float, lat: float) -> tuple[int, int]:
     return min(x, InitialValues.point_side_lon_count), min(y, InitialValues.point_side_lat_count)
 
 
+def get_xy_from_coord_raw_many(lons: np.ndarray, lats: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Batched get_xy_from_coord_raw, a single geodesic call for all coordinates."""
+    projection = _active_projection()
+    if projection is not None and projection.covers_many(lons, lats):
+        x_metres, y_metres = projection.to_metres(lons, lats)
+    else:
+        x_metres, y_metres = _geodesic_metres_from_coordinates(lons, lats)
+    x = np.trunc(x_metres).astype(np.int64) // InitialValues.point_side_size
+    y = np.trunc(y_metres).astype(np.int64) // InitialValues.point_side_size
+    return np.minimum(x, InitialValues.point_side_lon_count), np.minimum(y, InitialValues.point_side_lat_count)
+
+
 _geodesic = proj.Geod(ellps='WGS84')
 
 
@@ -69,10 +96,241 @@ def calculate_compass_bearing_and_dist(start: Coordinates, end: Coordinates) ->
     return bearing, dist
 
 
-_mapped_coordinates = dict()
+def _geodesic_metres_from_coordinates(lons: np.ndarray, lats: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Metres east and south of the top left corner of the simulation area, like get_xy_dist_from_coord."""
+    start = InitialValues.top_left_coord
+    forward_azimuth, _, distance = _geodesic.inv(np.full(len(lons), start.longitude), np.full(len(lats), start.latitude),
+                                                 lons, lats)
+    bearing = np.where(forward_azimuth < 0, forward_azimuth + 360, forward_azimuth)
+    rad = np.radians(bearing - BEARING_OFFSET)
+    return distance * np.cos(rad), distance * np.sin(rad)
+
+
+def _geodesic_coordinates_from_metres(x_metres: np.ndarray, y_metres: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Longitudes and latitudes of points given in metres east and south of the top left corner, like
+    get_coordinate_from_xy."""
+    degree_bearing = np.where((x_metres != 0) | (y_metres != 0),
+                              (180.0 + np.degrees(np.arctan2(-x_metres, y_metres))) % 360, 0)
+    start = InitialValues.top_left_coord
+    lons, lats, _ = _geodesic.fwd(np.full(len(x_metres), start.longitude), np.full(len(x_metres), start.latitude),
+                                  degree_bearing, np.hypot(x_metres, y_metres))
+    return lons, lats
+
+
+def _grid_parameters() -> tuple:
+    return (InitialValues.top_left_coord, InitialValues.point_side_size, InitialValues.point_side_lat_count,
+            InitialValues.point_side_lon_count)
+
+
+class _LocalProjection:
+    """
+    Polynomials fitted to the geodesic conversions between coordinates and metres east and south of the top left
+    corner, over the simulation area and a margin around it. Valid only for the grid it was fitted for.
+    """
+    DEGREE = 4
+    MARGIN = 0.05  # fraction of the area added on every side
+    SAMPLES = 41  # per side of the fitting grid
+
+    def __init__(self):
+        self.parameters = _grid_parameters()
+        self._width = InitialValues.point_side_lon_count * InitialValues.point_side_size
+        self._height = InitialValues.point_side_lat_count * InitialValues.point_side_size
+        self._exponents = [(i, j) for i in range(self.DEGREE + 1) for j in range(self.DEGREE + 1 - i)]
+        x_metres, y_metres = self._sample_grid(self.SAMPLES, 0)
+        lons, lats = _geodesic_coordinates_from_metres(x_metres, y_metres)
+        self.min_lon, self.max_lon = lons.min(), lons.max()
+        self.min_lat, self.max_lat = lats.min(), lats.max()
+        self._to_metres = self._fit(*self._normalized_coordinates(lons, lats), x_metres, y_metres)
+        self._to_coordinates = self._fit(*self._normalized_metres(x_metres, y_metres), lons, lats)
+
+    def _sample_grid(self, samples: int, offset: float) -> tuple[np.ndarray, np.ndarray]:
+        """Grid of points of the area with the margin, shifted by the offset fraction of the grid step."""
+        margin_x, margin_y = self.MARGIN * self._width, self.MARGIN * self._height
+        step_x = (self._width + 2 * margin_x) / (samples - 1)
+        step_y = (self._height + 2 * margin_y) / (samples - 1)
+        y_metres, x_metres = np.mgrid[0:samples - 1 if offset else samples, 0:samples - 1 if offset else samples]
+        return (x_metres.ravel() + offset) * step_x - margin_x, (y_metres.ravel() + offset) * step_y - margin_y
+
+    def _normalized_coordinates(self, lons, lats):
+        return (2 * lons - self.min_lon - self.max_lon) / (self.max_lon - self.min_lon), \
+               (2 * lats - self.min_lat - self.max_lat) / (self.max_lat - self.min_lat)
+
+    def _normalized_metres(self, x_metres, y_metres):
+        return 2 * x_metres / self._width - 1, 2 * y_metres / self._height - 1
+
+    def _fit(self, u: np.ndarray, v: np.ndarray, first: np.ndarray, second: np.ndarray) -> list[tuple[float, float]]:
+        terms = np.column_stack([u ** i * v ** j for i, j in self._exponents])
+        coefficients = np.linalg.lstsq(terms, np.column_stack([first, second]), rcond=None)[0]
+        return [(float(a), float(b)) for a, b in coefficients]
+
+    def _evaluate(self, u, v, coefficients: list[tuple[float, float]]):
+        """Works on floats and on arrays."""
+        u_powers, v_powers = [1.0], [1.0]
+        for _ in range(self.DEGREE):
+            u_powers.append(u_powers[-1] * u)
+            v_powers.append(v_powers[-1] * v)
+        first = second = 0.0
+        for (i, j), (a, b) in zip(self._exponents, coefficients):
+            term = u_powers[i] * v_powers[j]
+            first = first + a * term
+            second = second + b * term
+        return first, second
+
+    def to_metres(self, lons, lats):
+        """Metres east and south of the top left corner, of floats or of arrays."""
+        return self._evaluate(*self._normalized_coordinates(lons, lats), self._to_metres)
+
+    def to_coordinates(self, x_metres, y_metres):
+        """Longitudes and latitudes, of floats or of arrays."""
+        return self._evaluate(*self._normalized_metres(x_metres, y_metres), self._to_coordinates)
+
+    def covers(self, coordinate: Coordinates) -> bool:
+        return self.min_lon <= coordinate.longitude <= self.max_lon and \
+            self.min_lat <= coordinate.latitude <= self.max_lat
+
+    def covers_metres(self, x_metres, y_metres):
+        """Whether points given in metres are in the fitted area, of floats or of arrays."""
+        margin_x, margin_y = self.MARGIN * self._width, self.MARGIN * self._height
+        return (-margin_x <= x_metres) & (x_metres <= self._width + margin_x) & \
+            (-margin_y <= y_metres) & (y_metres <= self._height + margin_y)
+
+    def covers_many(self, lons: np.ndarray, lats: np.ndarray) -> bool:
+        return bool(((self.min_lon <= lons) & (lons <= self.max_lon) &
+                     (self.min_lat <= lats) & (lats <= self.max_lat)).all())
+
+    def max_error(self) -> float:
+        """Largest distance in metres between the local and the geodesic conversions, both ways, checked between
+        the points of the fitting grid."""
+        x_metres, y_metres = self._sample_grid(self.SAMPLES, 0.5)
+        lons, lats = _geodesic_coordinates_from_metres(x_metres, y_metres)
+        local_x, local_y = self.to_metres(lons, lats)
+        local_lons, local_lats = self.to_coordinates(x_metres, y_metres)
+        _, _, inverse_error = _geodesic.inv(lons, lats, local_lons, local_lats)
+        return max(np.hypot(local_x - x_metres, local_y - y_metres).max(), inverse_error.max())
+
+
+_local_projection: Optional[_LocalProjection] = None
+
+
+def _active_projection() -> Optional[_LocalProjection]:
+    if _local_projection is not None and _local_projection.parameters == _grid_parameters():
+        return _local_projection
+    return None
+
+
+def get_projection_mode() -> ProjectionMode:
+    """Mode of the conversions in effect for the current simulation area."""
+    return ProjectionMode.LOCAL if _active_projection() is not None else ProjectionMode.GEODESIC
+
+
+def set_projection_mode(mode: ProjectionMode) -> ProjectionMode:
+    """
+    Selects the conversions between the grid and coordinates for the current simulation area. The local projection is
+    refused, and the geodesic conversions are kept, when its error is above InitialValues.projection_max_error of
+    point_side_size. Returns the mode in effect.
+    """
+    global _local_projection
+    _local_projection = None
+    if mode == ProjectionMode.LOCAL:
+        projection = _LocalProjection()
+        error = projection.max_error()
+        allowed_error = InitialValues.projection_max_error * InitialValues.point_side_size
+        if error > allowed_error:
+            logger.warning(f"Local projection error {error:.3f} m is above {allowed_error:.3f} m, "
+                           f"using geodesic conversions")
+            return ProjectionMode.GEODESIC
+        logger.info(f"Using local projection, max error {error:.3f} m")
+        _local_projection = projection
+    return mode
+
+
+def _coordinates_from_cells(xs: np.ndarray, ys: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Longitudes and latitudes of the given cells, computed in a single call."""
+    x_metres, y_metres = xs * float(InitialValues.point_side_size), ys * float(InitialValues.point_side_size)
+    projection = _active_projection()
+    if projection is None:
+        return _geodesic_coordinates_from_metres(x_metres, y_metres)
+    # the polynomials are not fitted outside of the area and its margin
+    covered = projection.covers_metres(x_metres, y_metres)
+    lons, lats = np.empty(len(x_metres)), np.empty(len(x_metres))
+    lons[covered], lats[covered] = projection.to_coordinates(x_metres[covered], y_metres[covered])
+    if not covered.all():
+        lons[~covered], lats[~covered] = _geodesic_coordinates_from_metres(x_metres[~covered], y_metres[~covered])
+    return lons, lats
+
+
+class _CoordinateGrid:
+    """
+    Latitudes and longitudes of the cells of the simulation grid, computed in square blocks with a single geodesic call
+    per block when the block is first used. Memory is bounded by the grid size.
+    """
+    BLOCK_SIZE = 64
+
+    def __init__(self):
+        self._parameters = None
+        self._blocks: dict[int, tuple[np.ndarray, np.ndarray]] = dict()  # block id -> (latitudes, longitudes)
+
+    def _check_parameters(self):
+        parameters = (_grid_parameters(), _active_projection())
+        if parameters != self._parameters:
+            self._parameters = parameters
+            self._blocks = dict()
+
+    def _compute_block(self, block_x: int, block_y: int) -> tuple[np.ndarray, np.ndarray]:
+        ys, xs = np.mgrid[block_y * self.BLOCK_SIZE:(block_y + 1) * self.BLOCK_SIZE,
+                          block_x * self.BLOCK_SIZE:(block_x + 1) * self.BLOCK_SIZE]
+        lons, lats = _coordinates_from_cells(xs.ravel(), ys.ravel())
+        return lats, lons
+
+    def _block(self, block_id: int, blocks_in_row: int) -> tuple[np.ndarray, np.ndarray]:
+        if block_id not in self._blocks:
+            self._blocks[block_id] = self._compute_block(block_id % blocks_in_row, block_id // blocks_in_row)
+        return self._blocks[block_id]
+
+    def coordinate(self, x: int, y: int) -> Coordinates:
+        self._check_parameters()
+        if not (0 <= x < InitialValues.point_side_lon_count and 0 <= y < InitialValues.point_side_lat_count):
+            return get_coordinate_from_xy(x, y)
+        blocks_in_row = -(-InitialValues.point_side_lon_count // self.BLOCK_SIZE)
+        block_lats, block_lons = self._block((y // self.BLOCK_SIZE) * blocks_in_row + x // self.BLOCK_SIZE,
+                                             blocks_in_row)
+        local = (y % self.BLOCK_SIZE) * self.BLOCK_SIZE + x % self.BLOCK_SIZE
+        return Coordinates(latitude=float(block_lats[local]), longitude=float(block_lons[local]))
+
+    def coordinates(self, xs: np.ndarray, ys: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        self._check_parameters()
+        lats, lons = np.empty(len(xs)), np.empty(len(xs))
+        inside = (0 <= xs) & (xs < InitialValues.point_side_lon_count) & \
+                 (0 <= ys) & (ys < InitialValues.point_side_lat_count)
+        block_x, local_x = np.divmod(xs, self.BLOCK_SIZE)
+        block_y, local_y = np.divmod(ys, self.BLOCK_SIZE)
+        blocks_in_row = -(-InitialValues.point_side_lon_count // self.BLOCK_SIZE)
+        block_ids = block_y * blocks_in_row + block_x
+        local = local_y * self.BLOCK_SIZE + local_x
+        for block_id in np.unique(block_ids[inside]).tolist():
+            block_lats, block_lons = self._block(block_id, blocks_in_row)
+            in_block = inside & (block_ids == block_id)
+            lats[in_block] = block_lats[local[in_block]]
+            lons[in_block] = block_lons[local[in_block]]
+        if not inside.all():
+            lons[~inside], lats[~inside] = _coordinates_from_cells(xs[~inside], ys[~inside])
+        return lats, lons
+
+
+_coordinate_grid = _CoordinateGrid()
+
+
+def get_coordinates_from_xy_many(xs: np.ndarray, ys: np.ndarray, cached: bool = True) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Returns latitudes and longitudes of the given cells. Cached lookups keep the blocks of the cells for later calls,
+    others compute only the given cells, which suits cells scattered over the grid.
+    """
+    xs, ys = np.asarray(xs, dtype=np.int64), np.asarray(ys, dtype=np.int64)
+    if cached:
+        return _coordinate_grid.coordinates(xs, ys)
+    lons, lats = _coordinates_from_cells(xs, ys)
+    return lats, lons
 
 
 def get_coordinate_from_xy_cached(coord: tuple[int, int]) -> Coordinates:
-    if coord not in _mapped_coordinates:
-        _mapped_coordinates[coord] = get_coordinate_from_xy(coord[0], coord[1])
-    return _mapped_coordinates[coord]
\ No newline at end of file
+    return _coordinate_grid.coordinate(int(coord[0]), int(coord[1]))